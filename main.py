@@ -4,7 +4,21 @@ from tkinter import scrolledtext, Entry, Button
 import queue
 import threading
 import json
-from src.agent import Agencont
+import time
+import configparser
+from src.metricas import (
+    CIRCUITO_ABIERTO, DURACION_CICLO, EXTRACCIONES_JSON, FALLOS_JSON, LATENCIA_LLM,
+    LLAMADAS_EN_CURSO, PROFUNDIDAD_COLA, REINTENTOS_LLM, TOKENS_LLM, metricas, servir_metricas
+)
+
+# Render por lotes de la cola de salida: tiempo máximo por frame y tope de
+# mensajes por lote. Las ventanas conservan solo las últimas N líneas.
+PRESUPUESTO_FRAME_MS = 15
+MAX_MENSAJES_POR_FRAME = 500
+MAX_LINEAS_LOG = 5000
+MAX_LINEAS_CHAT = 2000
+# Refresco del panel de estadísticas
+INTERVALO_ESTADISTICAS_MS = 1000
 
 class NeoCGUI:
     def __init__(self, root, input_queue, output_queue):
@@ -12,6 +26,7 @@ class NeoCGUI:
         self.input_queue = input_queue
         self.output_queue = output_queue
         self.is_paused = False
+        self.streams = {}  # stream_id -> (marca de inicio, marca de fin) en chat_text
         
         self.root.title("NeoC Interface")
 
@@ -46,6 +61,10 @@ class NeoCGUI:
         log_prompts_check.pack(side="right", padx=5)
         log_flujo_check.pack(side="right", padx=5)
 
+        # --- Panel de Estadísticas ---
+        self.stats_label = tk.Label(self.root, font=("Courier", 9), justify="left", anchor="w")
+        self.stats_label.pack(padx=10, pady=(5, 0), fill="x")
+
         # --- Ventana de Interacción con el Usuario ---
         chat_frame = tk.Frame(self.root, borderwidth=2, relief="sunken")
         chat_frame.pack(padx=10, pady=5, fill="both", expand=True)
@@ -64,38 +83,127 @@ class NeoCGUI:
         send_button.pack(side="right", padx=5, pady=5)
 
         self.root.after(100, self.process_output_queue)
+        self.root.after(INTERVALO_ESTADISTICAS_MS, self.update_stats)
 
     def send_message(self, event=None):
         message = self.entry_box.get()
         if message:
             self.input_queue.put(message)
-            self.chat_text.config(state='normal')
-            self.chat_text.insert(tk.END, f"Usuario: {message}\n")
-            self.chat_text.config(state='disabled')
-            self.chat_text.see(tk.END)
+            self.append_text(self.chat_text, f"Usuario: {message}\n", MAX_LINEAS_CHAT)
             self.entry_box.delete(0, tk.END)
 
     def process_output_queue(self):
-        try:
-            message_data = self.output_queue.get_nowait()
+        """
+        Drena la cola de salida por lotes dentro de un presupuesto de tiempo por
+        frame y agrupa las inserciones: cada ventana se actualiza una sola vez
+        por lote, y luego se recorta a su máximo de líneas.
+        """
+        limite = time.perf_counter() + PRESUPUESTO_FRAME_MS / 1000
+        lineas_log = []
+        lineas_chat = []
+        procesados = 0
+        while procesados < MAX_MENSAJES_POR_FRAME and time.perf_counter() < limite:
+            try:
+                message_data = self.output_queue.get_nowait()
+            except queue.Empty:
+                break
+            procesados += 1
             msg_type = message_data.get("type")
             content = message_data.get("content")
 
             if msg_type == "log":
-                self.log_text.config(state='normal')
-                self.log_text.insert(tk.END, f"{content}\n")
-                self.log_text.config(state='disabled')
-                self.log_text.see(tk.END)
+                lineas_log.append(f"{content}\n")
+            elif msg_type == "response_delta":
+                # Los fragmentos se insertan en su marca: primero se vuelca lo acumulado
+                self.flush_chat(lineas_chat)
+                self.render_response_delta(message_data.get("stream_id"), content)
+            elif msg_type == "response_discard":
+                # Un stream que no tendrá respuesta final (p. ej. falló a mitad): se quita su texto parcial
+                stream_id = message_data.get("stream_id")
+                if stream_id in self.streams:
+                    self.flush_chat(lineas_chat)
+                    inicio, fin = self.streams.pop(stream_id)
+                    self.chat_text.config(state='normal')
+                    self.chat_text.delete(f"{inicio} linestart", f"{fin} +1c")
+                    self.chat_text.mark_unset(inicio, fin)
+                    self.chat_text.config(state='disabled')
             elif msg_type == "response":
-                self.chat_text.config(state='normal')
-                self.chat_text.insert(tk.END, f"NeoC: {content}\n")
-                self.chat_text.config(state='disabled')
-                self.chat_text.see(tk.END)
-        except queue.Empty:
-            pass
-        finally:
-            self.root.after(100, self.process_output_queue)
-    
+                stream_id = message_data.get("stream_id")
+                if stream_id in self.streams:
+                    self.flush_chat(lineas_chat)
+                    # Reemplaza el texto parcial por la respuesta final validada
+                    inicio, fin = self.streams.pop(stream_id)
+                    self.chat_text.config(state='normal')
+                    self.chat_text.delete(inicio, fin)
+                    self.chat_text.insert(inicio, content)
+                    self.chat_text.mark_unset(inicio, fin)
+                    self.chat_text.config(state='disabled')
+                else:
+                    lineas_chat.append(f"NeoC: {content}\n")
+
+        if lineas_log:
+            self.append_text(self.log_text, "".join(lineas_log), MAX_LINEAS_LOG)
+        self.flush_chat(lineas_chat)
+        if procesados:
+            self.chat_text.see(tk.END)
+
+        # Si quedó trabajo pendiente se vuelve enseguida, cediendo antes el turno a Tk
+        self.root.after(1 if procesados == MAX_MENSAJES_POR_FRAME or not self.output_queue.empty() else 100, self.process_output_queue)
+
+    def flush_chat(self, lineas_chat):
+        if lineas_chat:
+            self.append_text(self.chat_text, "".join(lineas_chat), MAX_LINEAS_CHAT)
+            lineas_chat.clear()
+
+    def append_text(self, widget, texto, max_lineas):
+        """Inserta texto al final de un ScrolledText y descarta las líneas más antiguas por encima de max_lineas."""
+        widget.config(state='normal')
+        widget.insert(tk.END, texto)
+        lineas = int(widget.index('end-1c').split('.')[0])
+        if lineas > max_lineas:
+            widget.delete('1.0', f'{lineas - max_lineas + 1}.0')
+        widget.config(state='disabled')
+        widget.see(tk.END)
+
+    def render_response_delta(self, stream_id, delta):
+        """Agrega en el lugar un fragmento de una respuesta que se está generando."""
+        self.chat_text.config(state='normal')
+        if stream_id not in self.streams:
+            inicio, fin = f"stream_{stream_id}_inicio", f"stream_{stream_id}_fin"
+            self.chat_text.insert(tk.END, "NeoC: \n")
+            # Ambas marcas quedan justo antes del salto de línea de esta respuesta
+            self.chat_text.mark_set(inicio, "end-2c")
+            self.chat_text.mark_gravity(inicio, tk.LEFT)
+            self.chat_text.mark_set(fin, "end-2c")
+            self.chat_text.mark_gravity(fin, tk.RIGHT)
+            self.streams[stream_id] = (inicio, fin)
+        self.chat_text.insert(self.streams[stream_id][1], delta)
+        self.chat_text.config(state='disabled')
+        self.chat_text.see(tk.END)
+
+    def update_stats(self):
+        """Resumen compacto de las métricas del proceso (las mismas que expone /metrics)."""
+        metricas.recolectar()
+        lineas = []
+        for suborgano in ("EGOS", "CONS", "SUBCON"):
+            lineas.append(
+                f"{suborgano:<6} {LATENCIA_LLM.cantidad(suborgano=suborgano):>5} llamadas"
+                f"  p50 {LATENCIA_LLM.percentil(50, suborgano=suborgano):6.2f}s"
+                f"  p95 {LATENCIA_LLM.percentil(95, suborgano=suborgano):6.2f}s"
+                f"  tokens {TOKENS_LLM.suma(suborgano=suborgano, tipo='entrada'):>8.0f} ent / {TOKENS_LLM.suma(suborgano=suborgano, tipo='salida'):>7.0f} sal"
+            )
+        lineas.append(
+            f"Ciclos {DURACION_CICLO.cantidad()} (p50 {DURACION_CICLO.percentil(50):.1f}s)"
+            f" · JSON fallidos {FALLOS_JSON.suma():.0f}/{EXTRACCIONES_JSON.suma():.0f}"
+            f" · ideas {PROFUNDIDAD_COLA.suma(cola='ideas_subconscientes'):.0f}"
+            f" · SUBCON pendientes {PROFUNDIDAD_COLA.suma(cola='subcon_pendientes'):.0f}"
+            f" · en curso {LLAMADAS_EN_CURSO.suma():.0f}"
+            f" · reintentos {REINTENTOS_LLM.suma():.0f}"
+            f" · circuitos abiertos {CIRCUITO_ABIERTO.suma():.0f}"
+        )
+        self.stats_label.config(text="\n".join(lineas))
+        self.root.after(INTERVALO_ESTADISTICAS_MS, self.update_stats)
+
     def toggle_pause(self):
         self.is_paused = not self.is_paused
         button_text = "Reanudar Pensamiento" if self.is_paused else "Pausar Pensamiento"
@@ -117,10 +225,34 @@ if __name__ == '__main__':
     input_q = queue.Queue()
     output_q = queue.Queue()
 
-    agente_neoc = Agencont(input_queue=input_q, output_queue=output_q)
-    agent_thread = threading.Thread(target=agente_neoc.iniciar_bucle_autonomo, daemon=True)
-    agent_thread.start()
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    if config.getboolean('METRICAS', 'HABILITADO', fallback=True):
+        host = config.get('METRICAS', 'HOST', fallback='127.0.0.1')
+        puerto = config.getint('METRICAS', 'PUERTO', fallback=9464)
+        try:
+            servir_metricas(host, puerto)
+            print(f"Métricas en http://{host}:{puerto}/metrics")
+        except OSError as e:
+            print(f"No se pudo abrir el endpoint de métricas en {host}:{puerto}: {e}")
 
+    # La ventana se abre primero. El agente (memoria, logs, estado reanudado) y el
+    # backend del LLM se preparan en segundo plano; lo que se escriba mientras tanto espera en input_q.
     root = tk.Tk()
     gui = NeoCGUI(root, input_q, output_q)
-    root.mainloop()
\ No newline at end of file
+    output_q.put({"type": "log", "content": "--- Preparando NeoC... ---"})
+
+    def iniciar_agente():
+        from src.agent import Agencont
+        from src.llm_handler import registro_modelos
+        threading.Thread(target=registro_modelos.precalentar, name="NeoC_Precalentar", daemon=True).start()
+        agente_neoc = Agencont(input_queue=input_q, output_queue=output_q)
+        agente_neoc.iniciar_bucle_autonomo()
+
+    agent_thread = threading.Thread(target=iniciar_agente, name="NeoC_Agente", daemon=True)
+    agent_thread.start()
+    root.mainloop()
+
+    # Al cerrar la ventana el agente guarda su último punto de control y la memoria pendiente
+    input_q.put("apagar")
+    agent_thread.join(timeout=10)
\ No newline at end of file
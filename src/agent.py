@@ -2,79 +2,277 @@
 import os
 import time
 import json
-import logging
-import sqlite3
 import configparser
 import re
 from datetime import datetime
 import queue
-from src.llm_handler import llamar_a_gemini
+import threading
+import collections
+import concurrent.futures
+from src.motor_llm import MotorLLM
+from src.llm_handler import cuota_por_minuto
+from src.memoria import MemoriaLargoPlazo
+from src.contexto import GestorContexto, estimar_tokens
+from src.estado import EstadoAgente
+from src.extraccion_json import extraer_json
+from src.registro import configurar_logger, detener_logger
+from src.resiliencia import CircuitoAbierto, ErrorLLM
+from src.metricas import (
+    CANDIDATOS_CONS, CICLOS, DURACION_CICLO, DURACION_TURNO, EXTRACCIONES_JSON, FALLOS_JSON, PROFUNDIDAD_COLA, metricas
+)
+
+
+class PensamientoInterrumpido(Exception):
+    """Se lanza cuando llega un estímulo externo mientras una llamada interna está en curso."""
+    pass
+
+
+def _es_comando(message) -> bool:
+    """Comandos de control de la GUI (JSON con "command"): no interrumpen al pensamiento en curso."""
+    try:
+        datos = json.loads(message)
+    except (json.JSONDecodeError, TypeError):
+        return False
+    return isinstance(datos, dict) and "command" in datos
+
+
+_ESCAPES_JSON = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+
+def _contenidos_parciales(texto: str) -> list:
+    """
+    Extrae de un JSON posiblemente incompleto los valores (parciales) de cada
+    clave "contenido", en orden de aparición. Una secuencia de escape cortada
+    al final del texto se omite hasta que llegue completa; también un \\uXXXX
+    de surrogate alto, hasta que llegue el bajo, para unirlos en un solo
+    carácter como hace json.loads.
+    """
+    resultados = []
+    for match in re.finditer(r'"contenido"\s*:\s*"', texto):
+        i = match.end()
+        partes = []
+        while i < len(texto):
+            char = texto[i]
+            if char == '"':
+                break
+            if char == '\\':
+                if i + 1 >= len(texto):
+                    break
+                siguiente = texto[i + 1]
+                if siguiente == 'u':
+                    if i + 6 > len(texto):
+                        break
+                    try:
+                        codigo = int(texto[i + 2:i + 6], 16)
+                    except ValueError:
+                        break
+                    i += 6
+                    if 0xD800 <= codigo <= 0xDBFF:
+                        # Par surrogate (p. ej. un emoji): el bajo llega en el siguiente \uXXXX
+                        resto = texto[i:i + 6]
+                        if len(resto) < 6 and '\\u'.startswith(resto[:2]):
+                            break
+                        if resto.startswith('\\u'):
+                            try:
+                                bajo = int(resto[2:], 16)
+                            except ValueError:
+                                bajo = None
+                            if bajo is not None and 0xDC00 <= bajo <= 0xDFFF:
+                                codigo = 0x10000 + ((codigo - 0xD800) << 10) + (bajo - 0xDC00)
+                                i += 6
+                    partes.append(chr(codigo))
+                    continue
+                partes.append(_ESCAPES_JSON.get(siguiente, siguiente))
+                i += 2
+                continue
+            partes.append(char)
+            i += 1
+        resultados.append("".join(partes))
+    return resultados
+
+
+def _palabras(texto: str) -> set:
+    return set(re.findall(r'\w{3,}', texto.lower()))
+
+
+def puntuar_candidato(candidato: str, pensamiento_previo: str) -> float:
+    """
+    Ranking barato de los candidatos de CONS, sin llamar al LLM: premia la
+    fracción de palabras que el candidato agrega respecto del pensamiento
+    previo (evita que el ciclo se repita) y penaliza los muy breves.
+    """
+    palabras = _palabras(candidato)
+    if not palabras:
+        return 0.0
+    novedad = len(palabras - _palabras(pensamiento_previo)) / len(palabras)
+    return novedad * min(1.0, len(palabras) / 12)
+
 
 class Agencont:
-    def __init__(self, input_queue=None, output_queue=None):
+    def __init__(self, input_queue=None, output_queue=None, motor=None, espacio=None, dir_logs='logs', dir_datos='database'):
+        """
+        motor: MotorLLM compartido (p. ej. por todas las sesiones del servidor);
+        si no se indica, el agente crea el suyo. espacio: nombre de la sesión;
+        separa sus logs y su memoria en dir_logs/<espacio> y dir_datos/<espacio>.
+        """
         self.input_queue = input_queue
         self.output_queue = output_queue
+        self.espacio = espacio
+        self.dir_logs = os.path.join(dir_logs, espacio) if espacio else dir_logs
+        self.dir_datos = os.path.join(dir_datos, espacio) if espacio else dir_datos
         
-        os.makedirs('logs', exist_ok=True)
-        os.makedirs('database', exist_ok=True)
+        os.makedirs(self.dir_logs, exist_ok=True)
+        os.makedirs(self.dir_datos, exist_ok=True)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if espacio:
+            timestamp = f"{espacio}_{timestamp}"
+
+        self.config = configparser.ConfigParser()
+        self.config.read('config.ini')
         
-        # --- Configuración de Loggers ---
-        self.logger = self._setup_logger(f"NeoC_Logger_{timestamp}", f'logs/flujo_{timestamp}.log', '%(asctime)s - %(levelname)s - %(message)s')
-        self.prompt_logger = self._setup_logger(f"NeoC_Prompt_Logger_{timestamp}", f'logs/prompts_{timestamp}.log', '%(asctime)s - PROMPT PARA %(suborgano)s\n%(message)s\n--------------------\n')
-        self.conversation_logger = self._setup_logger(f"NeoC_Conversation_Logger_{timestamp}", f'logs/conversacion_{timestamp}.log', '[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+        # --- Configuración de Loggers (no bloqueantes, con rotación) ---
+        self.logger = self._setup_logger(f"NeoC_Logger_{timestamp}", os.path.join(self.dir_logs, 'flujo.log'), '%(asctime)s - %(levelname)s - %(message)s')
+        self.prompt_logger = self._setup_logger(f"NeoC_Prompt_Logger_{timestamp}", os.path.join(self.dir_logs, 'prompts.log'), '%(asctime)s - PROMPT PARA %(suborgano)s\n%(message)s\n--------------------\n')
+        self.conversation_logger = self._setup_logger(f"NeoC_Conversation_Logger_{timestamp}", os.path.join(self.dir_logs, 'conversacion.log'), '[%(asctime)s] %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
         
         # --- Estados del Agente ---
         self.is_paused = False
         self.log_settings = {"flujo": True, "prompts": False, "conversacion": True}
+        self.ciclo = 0
+        self.turno = 0
+        self.latencias = {}
         
         self._log_flujo(f"================== INICIO DE SESIÓN DE NeoC ==================")
-        self._log_flujo(f"Log de Flujo: logs/flujo_{timestamp}.log")
-        self._log_flujo(f"Log de Prompts: logs/prompts_{timestamp}.log")
-        self._log_flujo(f"Log de Conversación: logs/conversacion_{timestamp}.log")
+        self._log_flujo(f"Log de Flujo: {os.path.join(self.dir_logs, 'flujo.log')}")
+        self._log_flujo(f"Log de Prompts: {os.path.join(self.dir_logs, 'prompts.log')}")
+        self._log_flujo(f"Log de Conversación: {os.path.join(self.dir_logs, 'conversacion.log')}")
 
-        self.config = configparser.ConfigParser()
-        self.config.read('config.ini')
-        
         self.directivas = {
             "EGOS": self._cargar_directiva("EGOS"),
             "CONS": self._cargar_directiva("CONS"),
             "SUBCON": self._cargar_directiva("SUBCON")
         }
+        # prompt: la directiva encabeza cada prompt; sistema/cache: viaja como
+        # instrucción de sistema del subórgano y el prompt lleva solo lo variable
+        self.modo_directivas = self.config.get('DIRECTIVAS', 'MODO', fallback='sistema').strip().lower()
+        self.tokens_directiva_ahorrados = collections.Counter()
+        if self.modo_directivas != 'prompt':
+            tamanos = ", ".join(f"{suborgano}≈{estimar_tokens(directiva)}" for suborgano, directiva in self.directivas.items())
+            self._log_flujo(f"Directivas como instrucción de sistema (modo {self.modo_directivas}); tokens fuera de cada prompt: {tamanos}")
         
-        self.memoria_corto_plazo = []
+        self._motor_propio = motor is None
+        self.motor = motor if motor is not None else MotorLLM()
+        self.modo_ciclo = self.config.get('AGENTE', 'MODO_CICLO', fallback='secuencial').strip().lower()
+        self.streaming = self.config.getboolean('AGENTE', 'STREAMING', fallback=True)
+        self.extracciones_json = 0
+        self.intervalo_pensamiento = self.config.getfloat('AGENTE', 'INTERVALO_PENSAMIENTO', fallback=10.0)
+        self.intervalo_maximo = self.config.getfloat('AGENTE', 'INTERVALO_MAXIMO', fallback=300.0)
+        self.ciclos_fallidos = 0
+        self.pensamiento_actual = "Que es NeoC?"
+        self._bandeja = queue.Queue()
+        self._esperas = set()
+        self._lock_esperas = threading.Lock()
+        # Hay en la bandeja un mensaje de usuario (o 'apagar') que debe interrumpir la llamada en curso
+        self._interrupcion = threading.Event()
+        self.fallos_json = collections.Counter()
+        self.errores_llm = collections.Counter()  # Tipo de ErrorLLM -> llamadas fallidas
+        self.memoria_corto_plazo = GestorContexto(
+            presupuestos={s: self.config.getint('CONTEXTO', f'PRESUPUESTO_{s}', fallback=1500) for s in ("EGOS", "CONS", "SUBCON")},
+            resumir=lambda prompt: self.motor.enviar(self.config.get('CONTEXTO', 'SUBORGANO_RESUMEN', fallback='CONS'), prompt),
+            lote_resumen=self.config.getint('CONTEXTO', 'LOTE_RESUMEN', fallback=300),
+            max_tokens_resumen=self.config.getint('CONTEXTO', 'MAX_TOKENS_RESUMEN', fallback=300)
+        )
         self.ideas_subconscientes = []
-        self.db_conn = sqlite3.connect('database/neoc_memory.db')
-        self.db_cursor = self.db_conn.cursor()
-        self.db_cursor.execute("CREATE TABLE IF NOT EXISTS memoria_largo_plazo (id INTEGER PRIMARY KEY, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, contenido TEXT, tipo TEXT)")
-        self.db_conn.commit()
+        self.subcon_pendientes = []
+        self.memoria_largo_plazo = MemoriaLargoPlazo(os.path.join(self.dir_datos, 'neoc_memory.db'))
+        self.recuerdos_top_k = self.config.getint('MEMORIA', 'TOP_K', fallback=5)
+        # Modo exploración: varios candidatos de CONS por ciclo autónomo
+        self.candidatos_cons = max(1, self.config.getint('EXPLORACION', 'CANDIDATOS', fallback=1))
+        self.concurrencia_exploracion = self.config.getint('EXPLORACION', 'CONCURRENCIA', fallback=0)
+        self.temperaturas_exploracion = [
+            float(t) for t in self.config.get('EXPLORACION', 'TEMPERATURAS', fallback='').split(',') if t.strip()
+        ]
+        self.ranking_exploracion = self.config.get('EXPLORACION', 'RANKING', fallback='heuristica').strip().lower()
+        # Candidatos no elegidos: cola propia y acotada que solo alimenta a CONS cuando no hay ideas de SUBCON
+        self.alternativas_cons = collections.deque(maxlen=max(1, self.config.getint('EXPLORACION', 'MAX_ALTERNATIVAS', fallback=3)))
+        # Puntos de control del estado de trabajo; con ESTADO.REANUDAR se continúa donde se detuvo
+        reanudar = self.config.getboolean('ESTADO', 'REANUDAR', fallback=True)
+        self.estado = EstadoAgente(os.path.join(self.dir_datos, 'neoc_estado.db'), reanudar)
+        self.intervalo_estado = self.config.getfloat('ESTADO', 'INTERVALO', fallback=5.0)
+        self._ultimo_punto_control = time.monotonic()
+        self._punto_pendiente = False  # Se omitió un punto de control por el intervalo: hay que hacerlo al vencer
+        self.reanudado = reanudar and self._reanudar()
+        # Llamadas de un ciclo autónomo por subórgano: los candidatos de CONS y el ranking de SUBCON
+        self.llamadas_por_ciclo = {
+            "EGOS": 1,
+            "CONS": self.candidatos_cons,
+            "SUBCON": 2 if self.candidatos_cons > 1 and self.ranking_exploracion == "subcon" else 1,
+        }
+        self.sesion = espacio or "principal"  # Etiqueta de sus métricas
+        metricas.registrar_colector(self._recolectar_metricas)
+
+    def _reanudar(self):
+        """Restaura el último punto de control; devuelve False si no había ninguno."""
+        guardado = self.estado.cargar()
+        if guardado is None:
+            return False
+        valores, turnos, primer_turno = guardado
+        self.pensamiento_actual = valores.get("pensamiento_actual", self.pensamiento_actual)
+        self.ideas_subconscientes = list(valores.get("ideas_subconscientes", []))
+        self.alternativas_cons.extend(valores.get("alternativas_cons", []))
+        self.ciclo = valores.get("ciclo", self.ciclo)
+        self.turno = valores.get("turno", self.turno)
+        self.memoria_corto_plazo.restaurar(turnos, valores.get("resumen", ""), primer_turno)
+        self._log_flujo(
+            f"Estado reanudado: ciclo {self.ciclo}, turno {self.turno}, {len(turnos)} turnos de corto plazo, "
+            f"{len(self.ideas_subconscientes)} ideas subconscientes. Pensamiento actual: '{str(self.pensamiento_actual)[:80]}'"
+        )
+        return True
+
+    def _punto_de_control(self, forzar: bool = False):
+        """
+        Encola (solo con lo que cambió) el estado de trabajo, como mucho una
+        vez cada ESTADO.INTERVALO segundos. Si lo omite por el intervalo queda
+        pendiente, y el bucle despierta al vencer el plazo para hacerlo.
+        """
+        if not forzar and time.monotonic() - self._ultimo_punto_control < self.intervalo_estado:
+            self._punto_pendiente = True
+            return
+        self._ultimo_punto_control = time.monotonic()
+        self._punto_pendiente = False
+        self.estado.guardar(
+            {
+                "pensamiento_actual": self.pensamiento_actual,
+                "ideas_subconscientes": self.ideas_subconscientes,
+                "alternativas_cons": list(self.alternativas_cons),
+                "resumen": self.memoria_corto_plazo.resumen,
+                "ciclo": self.ciclo,
+                "turno": self.turno,
+            },
+            [texto for texto, _ in self.memoria_corto_plazo.turnos],
+            self.memoria_corto_plazo.primer_turno
+        )
 
     def _setup_logger(self, name, log_file, fmt, datefmt=None):
-        logger = logging.getLogger(name)
-        logger.setLevel(logging.DEBUG)
-        if not logger.handlers:
-            file_handler = logging.FileHandler(log_file, mode='w', encoding='utf-8')
-            formatter = logging.Formatter(fmt, datefmt=datefmt)
-            file_handler.setFormatter(formatter)
-            logger.addHandler(file_handler)
-            if "NeoC_Logger" in name:
-                stream_handler = logging.StreamHandler()
-                stream_handler.setFormatter(formatter)
-                logger.addHandler(stream_handler)
-        return logger
-
-    def _log_flujo(self, message, level="info"):
+        # Las sesiones del servidor no escriben en consola, solo en sus archivos
+        return configurar_logger(name, log_file, fmt, self.config, datefmt=datefmt, consola="NeoC_Logger" in name and not self.espacio)
+
+    def _log_flujo(self, message, level="info", suborgano=None):
         if self.log_settings.get("flujo", True):
-            getattr(self.logger, level)(message)
+            extra = {"ciclo": self.ciclo, "turno": self.turno}
+            if suborgano:
+                extra["suborgano"] = suborgano
+                extra["latencia"] = self.latencias.get(suborgano)
+            getattr(self.logger, level)(message, extra=extra)
 
     def _log_prompt(self, suborgano, prompt):
         if self.log_settings.get("prompts", True):
-            self.prompt_logger.info(prompt, extra={'suborgano': suborgano.upper()})
+            self.prompt_logger.info(prompt, extra={'suborgano': suborgano.upper(), 'ciclo': self.ciclo, 'turno': self.turno})
 
     def _log_conversacion(self, message):
         if self.log_settings.get("conversacion", True):
-            self.conversation_logger.info(message)
+            self.conversation_logger.info(message, extra={'turno': self.turno})
 
     def _cargar_directiva(self, nombre_suborgano: str) -> str:
         try:
@@ -84,170 +282,522 @@ class Agencont:
             self._log_flujo(f"No se encontró el archivo de directiva para {nombre_suborgano}.", "error")
             return f"<DIRECTIVA>ERROR: Archivo no encontrado para {nombre_suborgano}.</DIRECTIVA>"
 
-    def _extraer_json(self, texto: str) -> str:
+    def _extraer_json(self, texto: str, suborgano: str):
+        """extraer_json con su registro y métricas; el llamador decide si un fallo cuenta como fallo del ciclo."""
+        self.extracciones_json += 1
+        EXTRACCIONES_JSON.inc(sesion=self.sesion, suborgano=suborgano)
+        resultado = extraer_json(texto)
+        if not resultado.ok:
+            FALLOS_JSON.inc(sesion=self.sesion, suborgano=suborgano)
+            self._log_flujo(f"No se pudo extraer un JSON de la respuesta de {suborgano}: {resultado.error}", "warning")
+        return resultado
+
+    def _parsear_json(self, texto: str, suborgano: str) -> dict:
         """
-        Busca y extrae la primera cadena JSON válida de un texto.
-        Maneja bloques de código ```json y JSON anidado con saltos de línea.
+        Devuelve el primer objeto JSON de la respuesta del subórgano (ver
+        extraer_json). Si no hay uno válido registra el motivo, cuenta el fallo
+        y lanza json.JSONDecodeError para que cada llamador aplique su respaldo.
         """
-        # Primero, busca el patrón de bloque de código que es más específico
-        match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', texto, re.DOTALL)
-        if match:
-            return match.group(1)
-
-        # Si no encuentra un bloque de código, busca un JSON válido en el texto.
-        # Este método es más robusto y maneja llaves anidadas.
-        stack = []
-        start_index = -1
-        for i, char in enumerate(texto):
-            if char == '{':
-                if not stack:
-                    start_index = i
-                stack.append('{')
-            elif char == '}':
-                if stack:
-                    stack.pop()
-                    if not stack and start_index != -1:
-                        # Hemos encontrado un posible objeto JSON completo
-                        possible_json = texto[start_index : i + 1]
-                        try:
-                            # Validamos si es realmente un JSON
-                            json.loads(possible_json)
-                            return possible_json
-                        except json.JSONDecodeError:
-                            # Si no es válido, seguimos buscando
-                            start_index = -1
-                            continue
-        
-        self._log_flujo("No se pudo extraer un JSON limpio del texto.", "warning")
-        return texto # Devuelve el texto original si todo falla
+        resultado = self._extraer_json(texto, suborgano)
+        if resultado.ok:
+            return resultado.datos
+        self.fallos_json[suborgano] += 1
+        raise json.JSONDecodeError(resultado.error, texto, 0)
 
-    def _construir_prompt(self, suborgano: str, mision: str, contexto: str = "") -> str:
-        directiva = self.directivas.get(suborgano, "")
-        return f"{directiva}\n<CONTEXTO>{contexto}</CONTEXTO>\n<MISION>{mision}</MISION>"
+    def _recuerdos_relevantes(self, mision: str, contexto: str = "", consulta: str = None) -> str:
+        """
+        Recupera de la memoria de largo plazo los recuerdos más relevantes para
+        la consulta (la parte variable de la misión; por defecto, la misión
+        entera), omitiendo los que ya aparecen en la misión o en el contexto,
+        y los devuelve como etiqueta <RECUERDOS>, o cadena vacía si no hay ninguno.
+        """
+        # Se piden de más para que los omitidos no reduzcan los k recuerdos útiles
+        candidatos = self.memoria_largo_plazo.buscar(consulta or mision, 2 * self.recuerdos_top_k)
+        recuerdos = [
+            r["contenido"] for r in candidatos
+            if r["contenido"] not in contexto and r["contenido"] not in mision
+        ][:self.recuerdos_top_k]
+        if not recuerdos:
+            return ""
+        return "<RECUERDOS>" + "\n".join(recuerdos) + "</RECUERDOS>\n"
+
+    def _encabezado_directiva(self, suborgano: str) -> str:
+        """La directiva al inicio del prompt solo en modo prompt; si no, va como instrucción de sistema."""
+        if self.modo_directivas != 'prompt':
+            return ""
+        return self.directivas.get(suborgano, "") + "\n"
+
+    def _instruccion_sistema(self, suborgano: str):
+        """
+        Directiva que acompaña a una llamada como instrucción de sistema (None en
+        modo prompt). Acumula los tokens que así dejan de viajar en el prompt.
+        """
+        if self.modo_directivas == 'prompt':
+            return None
+        directiva = self.directivas.get(suborgano)
+        if directiva:
+            self.tokens_directiva_ahorrados[suborgano] += estimar_tokens(directiva)
+        return directiva
+
+    def _construir_prompt(self, suborgano: str, mision: str, contexto: str = "", consulta: str = None) -> str:
+        directiva = self._encabezado_directiva(suborgano)
+        recuerdos = self._recuerdos_relevantes(mision, contexto, consulta)
+        return f"{directiva}<CONTEXTO>{contexto}</CONTEXTO>\n{recuerdos}<MISION>{mision}</MISION>"
 
     def _construir_prompt_cons(self, mision: str, contexto: str = "") -> str:
-        directiva = self.directivas.get("CONS", "")
+        directiva = self._encabezado_directiva("CONS")
+        self._recoger_subcon_pendientes()
         idea_tag = ""
         if self.ideas_subconscientes:
             idea = self.ideas_subconscientes.pop(0)
             idea_tag = f"<IDEA_SUBCONSCIENTE>{idea}</IDEA_SUBCONSCIENTE>"
             self._log_flujo(f"INYECTANDO IDEA DE SUBCON: {idea}")
-        return f"{directiva}\n<CONTEXTO>{contexto}</CONTEXTO>\n{idea_tag}\n<MISION>{mision}</MISION>"
+        elif self.alternativas_cons:
+            idea = self.alternativas_cons.popleft()
+            idea_tag = f"<IDEA_SUBCONSCIENTE>{idea}</IDEA_SUBCONSCIENTE>"
+            self._log_flujo(f"INYECTANDO CANDIDATO ALTERNATIVO DE CONS: {idea}")
+        recuerdos = self._recuerdos_relevantes(mision, contexto)
+        return f"{directiva}<CONTEXTO>{contexto}</CONTEXTO>\n{recuerdos}{idea_tag}\n<MISION>{mision}</MISION>"
 
-    def _log_output(self, msg_type: str, content: str):
+    def _log_output(self, msg_type: str, content: str, **extra):
         if self.output_queue:
-            self.output_queue.put({"type": msg_type, "content": content})
+            self.output_queue.put({"type": msg_type, "content": content, **extra})
+
+    def _emitir_respuesta(self, contenido: str, stream_id: str = None):
+        """Envía una respuesta al usuario y la registra en la conversación y la memoria."""
+        if stream_id is None:
+            self._log_output("response", contenido)
+        else:
+            self._log_output("response", contenido, stream_id=stream_id)
+        contenido_en_linea = contenido.replace('\n', ' ')
+        self._log_conversacion(f"NeoC: {contenido_en_linea}")
+        self.memoria_corto_plazo.agregar(f"NeoC: {contenido}")
+        self.memoria_largo_plazo.guardar(f"NeoC: {contenido}", "conversacion")
+
+    def _verbalizar_en_stream(self, prompt: str) -> tuple:
+        """
+        Genera la verbalización final de EGOS en streaming a través del motor y
+        publica cada trozo nuevo de "contenido" como mensaje "response_delta"
+        (uno por acción, identificado por stream_id). Devuelve el texto
+        completo y los stream_id usados. Si el stream falla a mitad, descarta
+        los textos parciales ya publicados antes de propagar el error.
+        """
+        acumulado = ""
+        emitidos = []
+
+        def al_fragmento(fragmento):
+            # Corre en el hilo del motor; output_queue es segura entre hilos
+            nonlocal acumulado
+            acumulado += fragmento
+            for i, parcial in enumerate(_contenidos_parciales(acumulado)):
+                if i >= len(emitidos):
+                    emitidos.append(0)
+                if len(parcial) > emitidos[i]:
+                    self._log_output("response_delta", parcial[emitidos[i]:], stream_id=f"{self.turno}-{i}")
+                    emitidos[i] = len(parcial)
+
+        futuro = self.motor.enviar_stream("EGOS", prompt, al_fragmento, instruccion_sistema=self._instruccion_sistema("EGOS"))
+        try:
+            texto = self._esperar(futuro, "EGOS")
+        except ErrorLLM:
+            self._descartar_streams([f"{self.turno}-{i}" for i in range(len(emitidos))])
+            raise
+        return texto, [f"{self.turno}-{i}" for i in range(len(emitidos))]
+
+    def _descartar_streams(self, stream_ids):
+        """Pide a la interfaz que quite el texto parcial de streams que no recibirán respuesta final."""
+        for stream_id in stream_ids:
+            self._log_output("response_discard", "", stream_id=stream_id)
+
+    def _recolectar_metricas(self):
+        """Profundidad de las colas internas, leída al exponer las métricas."""
+        colas = {
+            "ideas_subconscientes": len(self.ideas_subconscientes),
+            "alternativas_cons": len(self.alternativas_cons),
+            "subcon_pendientes": len(self.subcon_pendientes),
+            "bandeja": self._bandeja.qsize(),
+            "memoria_corto_plazo": len(self.memoria_corto_plazo),
+            "memoria_largo_plazo_pendiente": self.memoria_largo_plazo.pendientes(),
+        }
+        for cola, profundidad in colas.items():
+            PROFUNDIDAD_COLA.fijar(profundidad, sesion=self.sesion, cola=cola)
+
+    def _registrar_error_llm(self, error: ErrorLLM):
+        self.errores_llm[type(error).__name__] += 1
+        self._log_flujo(f"Fallo de LLM ({type(error).__name__}): {error}", "error", suborgano=error.suborgano)
+
+    def _escuchar_entrada(self):
+        """
+        Hilo que bloquea sobre input_queue y reenvía cada mensaje a la bandeja
+        interna. Los mensajes de usuario despiertan al instante cualquier
+        llamada interrumpible en curso; los comandos de control esperan a que
+        termine y se atienden en el bucle.
+        """
+        while True:
+            message = self.input_queue.get()
+            self._bandeja.put(message)
+            if _es_comando(message):
+                continue
+            with self._lock_esperas:
+                self._interrupcion.set()
+                for despertador in self._esperas:
+                    despertador.set()
+            if isinstance(message, str) and message.lower().strip() == 'apagar':
+                return  # El agente se apaga: el hilo no debe quedar esperando
+
+    def _enviar(self, suborgano: str, prompt: str) -> concurrent.futures.Future:
+        """Programa la llamada en el motor con la directiva del subórgano como instrucción de sistema."""
+        return self.motor.enviar(suborgano, prompt, instruccion_sistema=self._instruccion_sistema(suborgano))
+
+    def _llamar(self, suborgano: str, prompt: str, interrumpible: bool = False) -> str:
+        """
+        Llama al LLM a través del motor asíncrono. Si es interrumpible, un mensaje
+        de usuario que llegue a la cola de entrada cancela la llamada en curso y
+        lanza PensamientoInterrumpido, en lugar de esperar a que termine.
+        """
+        return self._esperar(self._enviar(suborgano, prompt), suborgano, interrumpible)
+
+    def _esperar(self, futuro: concurrent.futures.Future, suborgano: str, interrumpible: bool = False):
+        """Espera el resultado de un Future del motor (una llamada o un lote), con la interrupción de _llamar."""
+        inicio = time.monotonic()
+        if not interrumpible or self.input_queue is None:
+            respuesta = futuro.result()
+            self.latencias[suborgano] = round(time.monotonic() - inicio, 3)
+            return respuesta
+
+        # Se duerme hasta que termine la llamada o llegue un mensaje, sin sondear
+        despertador = threading.Event()
+        futuro.add_done_callback(lambda f: despertador.set())
+        with self._lock_esperas:
+            self._esperas.add(despertador)
+        try:
+            if not self._interrupcion.is_set():
+                despertador.wait()
+        finally:
+            with self._lock_esperas:
+                self._esperas.discard(despertador)
+        if not futuro.done() and self._interrupcion.is_set():
+            futuro.cancel()
+            raise PensamientoInterrumpido(suborgano)
+        respuesta = futuro.result()
+        self.latencias[suborgano] = round(time.monotonic() - inicio, 3)
+        return respuesta
+
+    def _intervalo_pensamiento(self, duracion_ciclo: float, ciclo_fallido: bool) -> float:
+        """
+        Intervalo hasta el próximo ciclo autónomo. Parte de INTERVALO_PENSAMIENTO,
+        lo estira si el ritmo de llamadas de algún modelo superaría su RPM de
+        LIMITES (la misma cuota que aplica llm_handler) y lo duplica por cada
+        ciclo fallido consecutivo, hasta INTERVALO_MAXIMO.
+        """
+        self.ciclos_fallidos = self.ciclos_fallidos + 1 if ciclo_fallido else 0
+        intervalo = self.intervalo_pensamiento
+        llamadas_por_modelo = collections.Counter()
+        rpm_por_modelo = {}
+        for suborgano, llamadas in self.llamadas_por_ciclo.items():
+            modelo, rpm = cuota_por_minuto(suborgano)
+            llamadas_por_modelo[modelo] += llamadas
+            rpm_por_modelo[modelo] = rpm
+        for modelo, llamadas in llamadas_por_modelo.items():
+            if rpm_por_modelo[modelo] > 0:
+                intervalo = max(intervalo, 60.0 * llamadas / rpm_por_modelo[modelo] - duracion_ciclo)
+        intervalo *= 2 ** min(self.ciclos_fallidos, 6)
+        return min(intervalo, self.intervalo_maximo)
+
+    def _procesar_entrada(self, message) -> bool:
+        """Atiende un comando o mensaje de usuario. Devuelve False si se pidió apagar."""
+        is_command = False
+        try:
+            # --- LÓGICA DE DISTINCIÓN (CORREGIDO) ---
+            command_data = json.loads(message)
+            if isinstance(command_data, dict) and "command" in command_data:
+                is_command = True
+                command = command_data.get("command")
+                
+                if command == "toggle_pause":
+                    self.is_paused = not self.is_paused
+                    status = "PAUSADO" if self.is_paused else "REANUDADO"
+                    self._log_flujo(f"Comando '{command}' recibido. Bucle de pensamiento {status}.")
+                    self._log_output("log", f"--- Bucle de pensamiento {status} ---")
+                
+                elif command == "set_logging":
+                    self.log_settings.update(command_data.get("config", {}))
+                    self._log_flujo(f"Comando '{command}' recibido. Configuración: {self.log_settings}")
+                    self._log_output("log", f"--- Configuración de logs actualizada ---")
+        
+        except (json.JSONDecodeError, TypeError):
+            # No es un JSON o no tiene el formato de comando, así que es un mensaje de usuario
+            is_command = False
+
+        # Si no es un comando, trátalo como un mensaje de usuario
+        if not is_command:
+            input_usuario = message
+            if input_usuario.lower().strip() == 'apagar': return False
+            
+            self._log_flujo(f"INTERRUPCIÓN EXTERNA DETECTADA: '{input_usuario}'")
+            self._log_output("log", f"--- ESTÍMULO EXTERNO: '{input_usuario}' ---")
+            self._log_conversacion(f"Usuario: {input_usuario}")
+            inicio = time.monotonic()
+            try:
+                self.manejar_conversacion_externa(input_usuario)
+            except ErrorLLM as e:
+                self._registrar_error_llm(e)
+                # Aviso al usuario; no se guarda en memoria porque no es una respuesta de NeoC
+                self._log_output("response", "No puedo responder en este momento: el modelo no está disponible. Inténtalo de nuevo en unos instantes.")
+            DURACION_TURNO.observar(time.monotonic() - inicio, sesion=self.sesion)
+            self.pensamiento_actual = "reanudar la reflexión sobre la conciencia después de la interacción."
+        return True
 
     def iniciar_bucle_autonomo(self):
         self._log_flujo("Iniciando bucle de pensamiento autónomo.")
         self._log_output("log", "Iniciando bucle de pensamiento autónomo.")
-        pensamiento_actual = "Que es NeoC?"
+        if self.reanudado:
+            self._log_output("log", f"--- Estado reanudado en el ciclo {self.ciclo}: '{str(self.pensamiento_actual)[:80]}' ---")
+        if self.input_queue is not None:
+            threading.Thread(target=self._escuchar_entrada, name="NeoC_Entrada", daemon=True).start()
+        proximo_ciclo = time.monotonic()
 
         while True:
+            self._punto_de_control()
+            # Los mensajes que ya están en la bandeja se atienden antes del próximo ciclo
+            self._interrupcion.clear()
+            # Bloquea hasta que llegue un mensaje o venza el plazo del próximo
+            # ciclo o del punto de control pendiente; en pausa y sin punto de
+            # control pendiente espera sin plazo, sin consumir CPU.
+            plazos = [] if self.is_paused else [proximo_ciclo]
+            if self._punto_pendiente:
+                plazos.append(self._ultimo_punto_control + self.intervalo_estado)
+            espera = max(0.0, min(plazos) - time.monotonic()) if plazos else None
             try:
-                message = self.input_queue.get_nowait()
-                is_command = False
-                try:
-                    # --- LÓGICA DE DISTINCIÓN (CORREGIDO) ---
-                    command_data = json.loads(message)
-                    if isinstance(command_data, dict) and "command" in command_data:
-                        is_command = True
-                        command = command_data.get("command")
-                        
-                        if command == "toggle_pause":
-                            self.is_paused = not self.is_paused
-                            status = "PAUSADO" if self.is_paused else "REANUDADO"
-                            self._log_flujo(f"Comando '{command}' recibido. Bucle de pensamiento {status}.")
-                            self._log_output("log", f"--- Bucle de pensamiento {status} ---")
-                        
-                        elif command == "set_logging":
-                            self.log_settings.update(command_data.get("config", {}))
-                            self._log_flujo(f"Comando '{command}' recibido. Configuración: {self.log_settings}")
-                            self._log_output("log", f"--- Configuración de logs actualizada ---")
-                
-                except (json.JSONDecodeError, TypeError):
-                    # No es un JSON o no tiene el formato de comando, así que es un mensaje de usuario
-                    is_command = False
-
-                # Si no es un comando, trátalo como un mensaje de usuario
-                if not is_command:
-                    input_usuario = message
-                    if input_usuario.lower().strip() == 'apagar': break
-                    
-                    self._log_flujo(f"INTERRUPCIÓN EXTERNA DETECTADA: '{input_usuario}'")
-                    self._log_output("log", f"--- ESTÍMULO EXTERNO: '{input_usuario}' ---")
-                    self._log_conversacion(f"Usuario: {input_usuario}")
-                    self.manejar_conversacion_externa(input_usuario)
-                    pensamiento_actual = "reanudar la reflexión sobre la conciencia después de la interacción."
-                
-                continue # Siempre vuelve al inicio del bucle tras procesar un item de la cola
-
+                message = self._bandeja.get(timeout=espera)
             except queue.Empty:
-                pass
+                message = None
+
+            if message is not None:
+                if not self._procesar_entrada(message):
+                    break
+                continue # Siempre vuelve al inicio del bucle tras procesar un item de la cola
+            if self.is_paused or time.monotonic() < proximo_ciclo:
+                continue  # Solo venció el plazo del punto de control
             
             # --- Lógica del Bucle de Pensamiento Interno ---
-            if self.is_paused:
-                time.sleep(1)
+            inicio = time.monotonic()
+            fallos_previos = sum(self.fallos_json.values())
+            try:
+                self.pensamiento_actual = self._ciclo_interno(self.pensamiento_actual)
+            except PensamientoInterrumpido as e:
+                CICLOS.inc(sesion=self.sesion, resultado="interrumpido")
+                self._log_flujo(f"Llamada interna a {e} cancelada por un estímulo externo.")
+                continue
+            except ErrorLLM as e:
+                # El pensamiento no avanza: el ciclo se repite más tarde en lugar de seguir con misiones de relleno
+                CICLOS.inc(sesion=self.sesion, resultado="fallido")
+                self._registrar_error_llm(e)
+                intervalo = self._intervalo_pensamiento(time.monotonic() - inicio, True)
+                if isinstance(e, CircuitoAbierto):
+                    intervalo = max(intervalo, e.reintentar_en)
+                    self._log_output("log", f"--- Modelo {e.modelo} no disponible: pensamiento autónomo en pausa {intervalo:.0f}s ---")
+                self._log_flujo(f"Ciclo interno fallido. Próximo intento en {intervalo:.1f}s.", "warning")
+                proximo_ciclo = time.monotonic() + intervalo
                 continue
 
-            self._log_output("log", f"Pensamiento Interno: '{str(pensamiento_actual)[:80]}...'")
-            
-            mision_egos = f"El último pensamiento fue: '{pensamiento_actual}'. Basado en esto, formula el siguiente paso lógico como una tarea para CONS."
-            prompt_egos = self._construir_prompt("EGOS", mision_egos)
-            self._log_prompt("EGOS", prompt_egos)
-            respuesta_egos_str = llamar_a_gemini("EGOS", prompt_egos)
-            self._log_flujo(f"Respuesta de EGOS: {respuesta_egos_str}")
-            self._log_output("log", f"EGOS (interno): {respuesta_egos_str}")
-            
-            try:
-                data_egos = json.loads(self._extraer_json(respuesta_egos_str))
-                mision_cons = data_egos.get("contenido", "Continuar la reflexión.")
-            except (json.JSONDecodeError, AttributeError):
-                mision_cons = "Reflexionar sobre un aspecto aleatorio de la filosofía."
+            duracion = time.monotonic() - inicio
+            CICLOS.inc(sesion=self.sesion, resultado="ok")
+            DURACION_CICLO.observar(duracion, sesion=self.sesion)
+            intervalo = self._intervalo_pensamiento(duracion, sum(self.fallos_json.values()) > fallos_previos)
+            self._log_flujo(f"Ciclo interno completado en {duracion:.2f}s. Próximo ciclo en {intervalo:.1f}s.")
+            proximo_ciclo = time.monotonic() + intervalo
 
-            prompt_cons = self._construir_prompt_cons(mision_cons, pensamiento_actual)
-            self._log_prompt("CONS", prompt_cons)
-            respuesta_cons_str = llamar_a_gemini("CONS", prompt_cons)
-            self._log_flujo(f"Respuesta de CONS: {respuesta_cons_str}")
+        if self.tokens_directiva_ahorrados:
+            self._log_flujo(f"Tokens de directiva enviados fuera del prompt en la sesión: {dict(self.tokens_directiva_ahorrados)}")
+        self.cerrar()
+
+    def cerrar(self):
+        """Guarda el último punto de control, confirma la memoria pendiente y libera los recursos propios del agente (logs, y el motor si no es compartido)."""
+        self._log_flujo("Apagando NeoC: confirmando la memoria de largo plazo pendiente.")
+        metricas.quitar_colector(self._recolectar_metricas)
+        PROFUNDIDAD_COLA.quitar(sesion=self.sesion)
+        self._punto_de_control(forzar=True)
+        self.estado.cerrar()
+        self.memoria_largo_plazo.cerrar()
+        if self._motor_propio:
+            self.motor.detener()
+        for logger in (self.logger, self.prompt_logger, self.conversation_logger):
+            detener_logger(logger)
+
+    def _ciclo_interno(self, pensamiento_actual: str) -> str:
+        """Ejecuta un ciclo EGOS -> CONS -> SUBCON y devuelve el nuevo pensamiento actual."""
+        self.ciclo += 1
+        self._log_output("log", f"Pensamiento Interno: '{str(pensamiento_actual)[:80]}...'")
+        
+        mision_egos = f"El último pensamiento fue: '{pensamiento_actual}'. Basado en esto, formula el siguiente paso lógico como una tarea para CONS."
+        prompt_egos = self._construir_prompt("EGOS", mision_egos, consulta=str(pensamiento_actual))
+        self._log_prompt("EGOS", prompt_egos)
+        respuesta_egos_str = self._llamar("EGOS", prompt_egos, interrumpible=True)
+        self._log_flujo(f"Respuesta de EGOS: {respuesta_egos_str}", suborgano="EGOS")
+        self._log_output("log", f"EGOS (interno): {respuesta_egos_str}")
+        
+        try:
+            data_egos = self._parsear_json(respuesta_egos_str, "EGOS")
+            mision_cons = data_egos.get("contenido", "Continuar la reflexión.")
+        except (json.JSONDecodeError, AttributeError):
+            mision_cons = "Reflexionar sobre un aspecto aleatorio de la filosofía."
+
+        prompt_cons = self._construir_prompt_cons(mision_cons, pensamiento_actual)
+        self._log_prompt("CONS", prompt_cons)
+        if self.candidatos_cons > 1:
+            pensamiento_actual = self._explorar_cons(prompt_cons, pensamiento_actual)
+        else:
+            respuesta_cons_str = self._llamar("CONS", prompt_cons, interrumpible=True)
+            self._log_flujo(f"Respuesta de CONS: {respuesta_cons_str}", suborgano="CONS")
             self._log_output("log", f"CONS (interno): {respuesta_cons_str}")
-            
+
             try:
-                data_cons = json.loads(self._extraer_json(respuesta_cons_str))
+                data_cons = self._parsear_json(respuesta_cons_str, "CONS")
                 pensamiento_actual = data_cons.get("contenido", pensamiento_actual)
+                self.memoria_largo_plazo.guardar(pensamiento_actual, "pensamiento")
             except (json.JSONDecodeError, AttributeError):
                 self._log_flujo("CONS no devolvió un JSON válido en ciclo interno.", "error")
 
-            mision_subcon = f"Analiza este pensamiento: '{pensamiento_actual}'"
-            prompt_subcon = self._construir_prompt("SUBCON", mision_subcon)
-            self._log_prompt("SUBCON", prompt_subcon)
-            respuesta_subco_str = llamar_a_gemini("SUBCON", prompt_subcon)
-            self._log_flujo(f"Respuesta de SUBCON: {respuesta_subco_str}")
-            self._log_output("log", f"SUBCON (interno): {respuesta_subco_str}")
-            
+        mision_subcon = f"Analiza este pensamiento: '{pensamiento_actual}'"
+        prompt_subcon = self._construir_prompt("SUBCON", mision_subcon, consulta=str(pensamiento_actual))
+        self._log_prompt("SUBCON", prompt_subcon)
+        if self.modo_ciclo == "pipeline":
+            # SUBCON corre en segundo plano mientras arranca el siguiente ciclo;
+            # su idea se inyecta en la primera llamada a CONS tras completarse.
+            self.subcon_pendientes.append(self._enviar("SUBCON", prompt_subcon))
+        else:
+            respuesta_subco_str = self._llamar("SUBCON", prompt_subcon, interrumpible=True)
+            self._procesar_respuesta_subcon(respuesta_subco_str)
+
+        return pensamiento_actual
+
+    def _explorar_cons(self, prompt_cons: str, pensamiento_actual: str) -> str:
+        """
+        Modo exploración (EXPLORACION.CANDIDATOS > 1): genera en paralelo
+        varios candidatos de CONS para la misma misión, cada uno con su
+        temperatura, elige el siguiente pensamiento y deja los demás en
+        alternativas_cons, del mejor al peor. Solo falla si fallan todas las
+        llamadas.
+        """
+        temperaturas = [
+            self.temperaturas_exploracion[i % len(self.temperaturas_exploracion)] if self.temperaturas_exploracion else None
+            for i in range(self.candidatos_cons)
+        ]
+        instruccion = self._instruccion_sistema("CONS")
+        llamadas = [
+            {"suborgano": "CONS", "prompt": prompt_cons, "instruccion_sistema": instruccion, "temperatura": temperatura}
+            for temperatura in temperaturas
+        ]
+        resultados = self._esperar(self.motor.enviar_lote(llamadas, self.concurrencia_exploracion), "CONS", interrumpible=True)
+
+        candidatos = []
+        errores = []
+        for temperatura, resultado in zip(temperaturas, resultados):
+            if isinstance(resultado, ErrorLLM):
+                errores.append(resultado)
+                CANDIDATOS_CONS.inc(sesion=self.sesion, resultado="error")
+                continue
+            if isinstance(resultado, BaseException):
+                raise resultado
+            self._log_flujo(f"Candidato de CONS (temperatura {temperatura}): {resultado}", suborgano="CONS")
+            datos = self._extraer_json(resultado, "CONS").datos
+            contenido = datos.get("contenido") if datos else None
+            if contenido:
+                candidatos.append(str(contenido))
+            else:
+                CANDIDATOS_CONS.inc(sesion=self.sesion, resultado="invalido")
+
+        if len(errores) == len(resultados):
+            raise errores[0]
+        for error in errores:
+            self._registrar_error_llm(error)
+        if not candidatos:
+            self.fallos_json["CONS"] += 1
+            self._log_flujo("Ningún candidato de CONS devolvió un JSON válido en ciclo interno.", "error")
+            return pensamiento_actual
+
+        indice = self._elegir_candidato(candidatos, pensamiento_actual)
+        elegido = candidatos.pop(indice)
+        CANDIDATOS_CONS.inc(sesion=self.sesion, resultado="elegido")
+        self._log_output("log", f"CONS (interno, {len(candidatos) + 1} candidatos): {elegido}")
+        self.memoria_largo_plazo.guardar(elegido, "pensamiento")
+        # La cola está acotada: si se llena, se descartan las alternativas más antiguas
+        alternativas = [c for c in dict.fromkeys(candidatos) if c != elegido]
+        alternativas.sort(key=lambda c: puntuar_candidato(c, pensamiento_actual), reverse=True)
+        for candidato in alternativas:
+            self.alternativas_cons.append(candidato)
+            CANDIDATOS_CONS.inc(sesion=self.sesion, resultado="alternativa")
+        return elegido
+
+    def _elegir_candidato(self, candidatos: list, pensamiento_actual: str) -> int:
+        """Índice del candidato elegido: por SUBCON (EXPLORACION.RANKING = subcon) o por puntuar_candidato."""
+        if len(candidatos) > 1 and self.ranking_exploracion == "subcon":
+            lista = "".join(f'<CANDIDATO n="{i + 1}">{c}</CANDIDATO>\n' for i, c in enumerate(candidatos))
+            mision = ("Elige el candidato más fértil para continuar la reflexión: novedoso, coherente con el pensamiento "
+                      "previo y que abra nuevas preguntas. Responde con la acción ELEGIR_CANDIDATO y su número como contenido.")
+            prompt = f"{self._encabezado_directiva('SUBCON')}<CONTEXTO>{pensamiento_actual}</CONTEXTO>\n<CANDIDATOS>\n{lista}</CANDIDATOS>\n<MISION>{mision}</MISION>"
+            self._log_prompt("SUBCON", prompt)
             try:
-                data_subcon = json.loads(self._extraer_json(respuesta_subco_str))
-                accion = data_subcon.get("accion") or data_subcon.get("acción")
-                if accion == "GENERAR_IDEA":
-                    idea_contenido = data_subcon.get("contenido")
-                    if idea_contenido: self.ideas_subconscientes.append(idea_contenido)
-            except (json.JSONDecodeError, AttributeError): pass
-            
-            time.sleep(10)
+                respuesta = self._llamar("SUBCON", prompt, interrumpible=True)
+            except ErrorLLM as e:
+                # Sin SUBCON el ciclo sigue con el ranking heurístico
+                self._registrar_error_llm(e)
+            else:
+                self._log_flujo(f"Ranking de SUBCON: {respuesta}", suborgano="SUBCON")
+                datos = self._extraer_json(respuesta, "SUBCON").datos or {}
+                numero = re.search(r'\d+', str(datos.get("contenido", "")))
+                if numero and 1 <= int(numero.group()) <= len(candidatos):
+                    return int(numero.group()) - 1
+                self._log_flujo("SUBCON no eligió un candidato válido; se usa el ranking heurístico.", "warning")
+        puntajes = [puntuar_candidato(c, pensamiento_actual) for c in candidatos]
+        return puntajes.index(max(puntajes))
+
+    def _procesar_respuesta_subcon(self, respuesta_subco_str: str):
+        self._log_flujo(f"Respuesta de SUBCON: {respuesta_subco_str}", suborgano="SUBCON")
+        self._log_output("log", f"SUBCON (interno): {respuesta_subco_str}")
+        
+        try:
+            data_subcon = self._parsear_json(respuesta_subco_str, "SUBCON")
+            accion = data_subcon.get("accion") or data_subcon.get("acción")
+            if accion in ("GENERAR_IDEA", "NUEVA_IDEA"):
+                idea_contenido = data_subcon.get("contenido")
+                if idea_contenido:
+                    self.ideas_subconscientes.append(idea_contenido)
+                    self.memoria_largo_plazo.guardar(idea_contenido, "idea")
+        except (json.JSONDecodeError, AttributeError): pass
+
+    def _recoger_subcon_pendientes(self):
+        """Procesa (sin esperar) los análisis de SUBCON en segundo plano que ya terminaron."""
+        pendientes = []
+        for futuro in self.subcon_pendientes:
+            if not futuro.done():
+                pendientes.append(futuro)
+            elif not futuro.cancelled():
+                try:
+                    respuesta = futuro.result()
+                except ErrorLLM as e:
+                    self._registrar_error_llm(e)
+                    continue
+                self._procesar_respuesta_subcon(respuesta)
+        self.subcon_pendientes = pendientes
 
     def manejar_conversacion_externa(self, input_usuario):
+        self.turno += 1
         self._log_flujo(f"--- INICIO PROCESAMIENTO DE ESTÍMULO EXTERNO: '{input_usuario}' ---")
-        self.memoria_corto_plazo.append(f"Usuario: {input_usuario}")
-        contexto_str = "\n".join(self.memoria_corto_plazo)
+        self.memoria_corto_plazo.agregar(f"Usuario: {input_usuario}")
+        self.memoria_largo_plazo.guardar(f"Usuario: {input_usuario}", "conversacion")
+        contexto_str = self.memoria_corto_plazo.contexto("EGOS")
         mision_egos_inicial = f"El usuario ha dicho: '{input_usuario}'. Analiza el contexto y decide la acción o acciones a tomar para mantener una conversación natural y proactiva."
-        prompt_egos = self._construir_prompt("EGOS", mision_egos_inicial, contexto_str)
+        prompt_egos = self._construir_prompt("EGOS", mision_egos_inicial, contexto_str, consulta=input_usuario)
         self._log_prompt("EGOS", prompt_egos)
-        respuesta_egos_str = llamar_a_gemini("EGOS", prompt_egos)
-        self._log_flujo(f"Respuesta de EGOS (decisión inicial): {respuesta_egos_str}")
+        respuesta_egos_str = self._llamar("EGOS", prompt_egos)
+        self._log_flujo(f"Respuesta de EGOS (decisión inicial): {respuesta_egos_str}", suborgano="EGOS")
         
         accion_egos = "OBSERVAR"
         data_egos = {}
         try:
-            data_egos = json.loads(self._extraer_json(respuesta_egos_str))
+            data_egos = self._parsear_json(respuesta_egos_str, "EGOS")
             if "acciones" in data_egos or (data_egos.get("accion") or data_egos.get("acción")) == "RESPONDER":
                  accion_egos = "RESPONDER"
         except (json.JSONDecodeError, AttributeError):
@@ -259,43 +809,52 @@ class Agencont:
             if isinstance(data_egos.get("acciones"), list) and data_egos["acciones"]:
                  mision_cons = data_egos["acciones"][0].get("contenido", input_usuario)
 
-            prompt_cons = self._construir_prompt_cons(mision_cons, contexto_str)
+            prompt_cons = self._construir_prompt_cons(mision_cons, self.memoria_corto_plazo.contexto("CONS"))
             self._log_prompt("CONS", prompt_cons)
-            respuesta_cons_str = llamar_a_gemini("CONS", prompt_cons)
-            self._log_flujo(f"Respuesta de CONS: {respuesta_cons_str}")
+            respuesta_cons_str = self._llamar("CONS", prompt_cons)
+            self._log_flujo(f"Respuesta de CONS: {respuesta_cons_str}", suborgano="CONS")
             
             try:
-                data_cons = json.loads(self._extraer_json(respuesta_cons_str))
+                data_cons = self._parsear_json(respuesta_cons_str, "CONS")
                 contenido_para_verbalizar = data_cons.get("contenido", "No tengo una respuesta.")
             except (json.JSONDecodeError, AttributeError):
                 contenido_para_verbalizar = "Hubo un error en mi pensamiento."
 
             mision_verbalizar = f"CONS ha propuesto esta respuesta: '{str(contenido_para_verbalizar)}'. Valídala, formúlala para el usuario y decide si debes hacer una pregunta de seguimiento."
-            prompt_verbalizar = self._construir_prompt("EGOS", mision_verbalizar, contexto_str)
+            prompt_verbalizar = self._construir_prompt("EGOS", mision_verbalizar, contexto_str, consulta=str(contenido_para_verbalizar))
             self._log_prompt("EGOS", prompt_verbalizar)
-            respuesta_final_str = llamar_a_gemini("EGOS", prompt_verbalizar)
-            self._log_flujo(f"Respuesta final de EGOS: {respuesta_final_str}")
-            
+            stream_ids = []
+            if self.streaming:
+                respuesta_final_str, stream_ids = self._verbalizar_en_stream(prompt_verbalizar)
+            else:
+                respuesta_final_str = self._llamar("EGOS", prompt_verbalizar)
+            self._log_flujo(f"Respuesta final de EGOS: {respuesta_final_str}", suborgano="EGOS")
+
+            # Cada respuesta final reemplaza en la GUI al texto parcial de su stream_id
+            usados = set()
+
+            def stream_id(i):
+                if i >= len(stream_ids):
+                    return None
+                usados.add(stream_ids[i])
+                return stream_ids[i]
+
             try:
-                data_final = json.loads(self._extraer_json(respuesta_final_str))
+                data_final = self._parsear_json(respuesta_final_str, "EGOS")
                 acciones = data_final.get("acciones")
                 if isinstance(acciones, list):
-                    for accion in acciones:
+                    for i, accion in enumerate(acciones):
                         contenido = accion.get("contenido", "...")
-                        self._log_output("response", contenido)
-                        self._log_conversacion(f"NeoC: {contenido.replace('\n', ' ')}")
-                        self.memoria_corto_plazo.append(f"NeoC: {contenido}")
+                        self._emitir_respuesta(contenido, stream_id(i))
                 else:
                     respuesta_para_usuario = data_final.get("contenido", "No puedo responder.")
-                    self._log_output("response", respuesta_para_usuario)
-                    self._log_conversacion(f"NeoC: {respuesta_para_usuario.replace('\n', ' ')}")
-                    self.memoria_corto_plazo.append(f"NeoC: {respuesta_para_usuario}")
+                    self._emitir_respuesta(respuesta_para_usuario, stream_id(0))
             except (json.JSONDecodeError, AttributeError) as e:
                 self._log_flujo(f"Error al procesar la respuesta final de EGOS: {e}", "error")
                 respuesta_para_usuario = "Hubo un error al formular mi respuesta."
-                self._log_output("response", respuesta_para_usuario)
-                self._log_conversacion(f"NeoC: {respuesta_para_usuario.replace('\n', ' ')}")
-                self.memoria_corto_plazo.append(f"NeoC: {respuesta_para_usuario}")
+                self._emitir_respuesta(respuesta_para_usuario, stream_id(0))
+            # Parciales sin respuesta final (la respuesta validada trajo menos acciones)
+            self._descartar_streams([s for s in stream_ids if s not in usados])
         else:
             self._log_flujo("EGOS ha decidido OBSERVAR.")
             self._log_output("log", "EGOS decidió OBSERVAR el estímulo. Sin respuesta verbal.")
@@ -0,0 +1,24 @@
+# src/backends/__init__.py
+
+import importlib
+
+# Proveedor -> (módulo, clase). Los módulos se importan solo al elegirse, de
+# modo que los proveedores offline no requieren las dependencias de Gemini.
+PROVEEDORES = {
+    "gemini": ("src.backends.gemini", "BackendGemini"),
+    "grabar": ("src.backends.replay", "BackendGrabacion"),
+    "reproducir": ("src.backends.replay", "BackendReproduccion"),
+    "stub": ("src.backends.stub", "BackendStub"),
+    "simulado": ("src.backends.stub", "BackendSimulado"),
+}
+
+
+def crear_backend(config, nombre: str = None):
+    """Instancia el proveedor indicado, o el de BACKEND.PROVEEDOR en config.ini."""
+    if nombre is None:
+        nombre = config.get('BACKEND', 'PROVEEDOR', fallback='gemini')
+    nombre = nombre.strip().lower()
+    if nombre not in PROVEEDORES:
+        raise ValueError(f"Proveedor de LLM desconocido: '{nombre}'. Opciones: {', '.join(PROVEEDORES)}")
+    modulo, clase = PROVEEDORES[nombre]
+    return getattr(importlib.import_module(modulo), clase)(config)
@@ -0,0 +1,59 @@
+# src/backends/base.py
+
+import asyncio
+from src.metricas import TOKENS_LLM
+
+
+class BackendLLM:
+    """
+    Interfaz común de los proveedores de LLM. Cada backend recibe el
+    ConfigParser ya leído de config.ini y responde a generar(); la variante
+    asíncrona por defecto delega en generar() dentro de un executor.
+    instruccion_sistema es la directiva fija del subórgano, que cada proveedor
+    envía fuera del prompt (instrucción de sistema o contexto cacheado).
+    temperatura, si se indica, reemplaza la del subórgano solo en esa llamada
+    (p. ej. los candidatos del modo exploración de CONS).
+    """
+
+    nombre = "base"
+
+    def __init__(self, config):
+        self.config = config
+
+    def ajustes(self, suborgano: str) -> dict:
+        """Modelo y ajustes de generación configurados para el subórgano."""
+        return {
+            "modelo": self.config['MODELS'][f'{suborgano}_MODEL'],
+            "temperature": float(self.config[f'SETTINGS_{suborgano}']['TEMPERATURE']),
+            "max_output_tokens": int(self.config[f'SETTINGS_{suborgano}']['MAX_OUTPUT_TOKENS']),
+            "json_mode": self.config.getboolean(f'SETTINGS_{suborgano}', 'JSON_MODE', fallback=False)
+        }
+
+    def actualizar(self, config) -> bool:
+        """
+        Aplica una config.ini modificada sin reconstruir el backend. Devuelve
+        False si el proveedor no lo admite y hay que crear uno nuevo.
+        """
+        return False
+
+    def registrar_uso(self, suborgano: str, entrada: int, salida: int, cacheados: int = 0):
+        """Acumula en las métricas los tokens de una respuesta (usage_metadata del proveedor)."""
+        modelo = self.ajustes(suborgano)["modelo"]
+        TOKENS_LLM.inc(entrada or 0, suborgano=suborgano, modelo=modelo, tipo="entrada")
+        TOKENS_LLM.inc(salida or 0, suborgano=suborgano, modelo=modelo, tipo="salida")
+        if cacheados:
+            TOKENS_LLM.inc(cacheados, suborgano=suborgano, modelo=modelo, tipo="cacheados")
+
+    def generar(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        raise NotImplementedError
+
+    def generar_stream(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None):
+        """Generador de fragmentos de texto. Por defecto entrega la respuesta completa de una vez."""
+        yield self.generar(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+
+    async def generar_async(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.generar, suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+
+    def cerrar(self):
+        pass
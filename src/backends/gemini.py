@@ -0,0 +1,151 @@
+# src/backends/gemini.py
+
+import datetime
+import os
+import threading
+import time
+import google.generativeai as genai
+from src.backends.base import BackendLLM
+from src.extraccion_json import ESQUEMAS_SUBORGANO
+from src.registro import logger_llm
+
+
+class BackendGemini(BackendLLM):
+    """
+    Proveedor Gemini con un GenerativeModel de larga vida por subórgano (y por
+    instrucción de sistema). Los modelos (y el transporte que abren en su
+    primera llamada) se reutilizan entre llamadas mientras el backend siga
+    vigente. Con DIRECTIVAS.MODO = cache la instrucción de sistema se sube una
+    vez como contexto cacheado del proveedor (CachedContent) y las llamadas
+    solo envían el prompt; si el proveedor rechaza la caché (p. ej. la
+    directiva no alcanza el mínimo de tokens del modelo) se usa la
+    instrucción de sistema normal. Una temperatura por llamada viaja como
+    generation_config de esa solicitud, sin crear otro modelo.
+    """
+
+    nombre = "gemini"
+
+    def __init__(self, config):
+        super().__init__(config)
+        api_key = os.getenv("API_KEY")
+        if not api_key:
+            raise ValueError("No se encontró la API_KEY en el archivo .env o en las variables de entorno.")
+        genai.configure(api_key=api_key)
+        self._lock = threading.Lock()
+        self._modelos = {}  # (suborgano, instruccion_sistema) -> (modelo, vence, CachedContent o None)
+        self.actualizar(config)
+
+    def actualizar(self, config) -> bool:
+        # El SDK ya está configurado con la misma API_KEY: basta con renovar los modelos
+        with self._lock:
+            self.config = config
+            self.modo_directivas = config.get('DIRECTIVAS', 'MODO', fallback='sistema').strip().lower()
+            self.ttl_cache = config.getint('DIRECTIVAS', 'CACHE_TTL', fallback=3600)
+            anteriores, self._modelos = self._modelos, {}
+        self._borrar_contextos(entrada[2] for entrada in anteriores.values())
+        return True
+
+    @staticmethod
+    def _borrar_contextos(contextos):
+        # Los contextos cacheados se facturan por tiempo de almacenamiento: se borran al dejar de usarse
+        for contexto in contextos:
+            if contexto is None:
+                continue
+            try:
+                contexto.delete()
+            except Exception:
+                pass
+
+    def _generation_config(self, suborgano: str, ajustes: dict):
+        salida_estructurada = {}
+        if ajustes["json_mode"]:
+            # Modo JSON nativo, restringido a la forma esperada del subórgano
+            salida_estructurada = {
+                "response_mime_type": "application/json",
+                "response_schema": ESQUEMAS_SUBORGANO.get(suborgano)
+            }
+        return genai.GenerationConfig(
+            temperature=ajustes["temperature"],
+            max_output_tokens=ajustes["max_output_tokens"],
+            **salida_estructurada
+        )
+
+    def _modelo_cacheado(self, ajustes: dict, instruccion_sistema: str, generation_config):
+        """Sube la instrucción de sistema como CachedContent; devuelve (modelo, vence, contexto) o None si no se pudo."""
+        try:
+            # Versiones antiguas del SDK no incluyen caching: también se usa la instrucción de sistema
+            from google.generativeai import caching
+            contexto = caching.CachedContent.create(
+                model=ajustes["modelo"],
+                system_instruction=instruccion_sistema,
+                ttl=datetime.timedelta(seconds=self.ttl_cache)
+            )
+        except Exception as e:
+            logger_llm().warning(f"No se pudo crear el contexto cacheado para {ajustes['modelo']}; se usa instrucción de sistema: {e}")
+            return None
+        modelo = genai.GenerativeModel.from_cached_content(cached_content=contexto, generation_config=generation_config)
+        # Se renueva un poco antes de que el proveedor lo expire
+        return modelo, time.monotonic() + self.ttl_cache * 0.9, contexto
+
+    def modelo(self, suborgano: str, instruccion_sistema: str = None):
+        clave = (suborgano, instruccion_sistema)
+        reemplazado = None
+        with self._lock:
+            entrada = self._modelos.get(clave)
+            if entrada is None or time.monotonic() >= entrada[1]:
+                reemplazado = entrada[2] if entrada is not None else None
+                ajustes = self.ajustes(suborgano)
+                generation_config = self._generation_config(suborgano, ajustes)
+                entrada = None
+                if instruccion_sistema and self.modo_directivas == 'cache':
+                    entrada = self._modelo_cacheado(ajustes, instruccion_sistema, generation_config)
+                if entrada is None:
+                    modelo = genai.GenerativeModel(
+                        model_name=ajustes["modelo"],
+                        generation_config=generation_config,
+                        system_instruction=instruccion_sistema
+                    )
+                    entrada = (modelo, float('inf'), None)
+                self._modelos[clave] = entrada
+        if reemplazado is not None:
+            self._borrar_contextos([reemplazado])
+        return entrada[0]
+
+    def _registrar_uso_respuesta(self, suborgano: str, respuesta):
+        uso = getattr(respuesta, "usage_metadata", None)
+        if uso is not None:
+            self.registrar_uso(
+                suborgano, getattr(uso, "prompt_token_count", 0), getattr(uso, "candidates_token_count", 0),
+                getattr(uso, "cached_content_token_count", 0)
+            )
+
+    @staticmethod
+    def _opciones_llamada(temperatura: float = None) -> dict:
+        # El SDK combina este generation_config con el del modelo solo para la solicitud
+        return {"generation_config": {"temperature": temperatura}} if temperatura is not None else {}
+
+    def generar(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        chat = self.modelo(suborgano, instruccion_sistema).start_chat(history=historial_contexto if historial_contexto else [])
+        response = chat.send_message(prompt, **self._opciones_llamada(temperatura))
+        self._registrar_uso_respuesta(suborgano, response)
+        return response.text
+
+    def generar_stream(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None):
+        chat = self.modelo(suborgano, instruccion_sistema).start_chat(history=historial_contexto if historial_contexto else [])
+        fragmento = None
+        for fragmento in chat.send_message(prompt, stream=True, **self._opciones_llamada(temperatura)):
+            yield fragmento.text
+        # El último fragmento trae el uso acumulado de toda la respuesta
+        if fragmento is not None:
+            self._registrar_uso_respuesta(suborgano, fragmento)
+
+    async def generar_async(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        chat = self.modelo(suborgano, instruccion_sistema).start_chat(history=historial_contexto if historial_contexto else [])
+        response = await chat.send_message_async(prompt, **self._opciones_llamada(temperatura))
+        self._registrar_uso_respuesta(suborgano, response)
+        return response.text
+
+    def cerrar(self):
+        with self._lock:
+            anteriores, self._modelos = self._modelos, {}
+        self._borrar_contextos(entrada[2] for entrada in anteriores.values())
@@ -0,0 +1,127 @@
+# src/backends/replay.py
+
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from src.backends.base import BackendLLM
+
+
+def _huella(suborgano: str, prompt: str, historial_contexto: list = None, temperatura: float = None) -> str:
+    partes = [suborgano, prompt, historial_contexto or []]
+    if temperatura is not None:
+        # Solo las llamadas con temperatura propia la incluyen: las grabaciones previas siguen valiendo
+        partes.append(temperatura)
+    material = json.dumps(partes, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+
+class BackendGrabacion(BackendLLM):
+    """
+    Envuelve a un proveedor real (BACKEND.GRABAR_PROVEEDOR) y registra cada
+    intercambio en un archivo JSONL compacto: subórgano, huella del prompt,
+    respuesta y latencia. Los prompts no se guardan, solo su huella. La
+    instrucción de sistema no entra en la huella: es fija por subórgano; la
+    temperatura por llamada sí, para distinguir los candidatos de CONS.
+    """
+
+    nombre = "grabar"
+
+    def __init__(self, config):
+        super().__init__(config)
+        from src.backends import crear_backend
+        self.interno = crear_backend(config, config.get('BACKEND', 'GRABAR_PROVEEDOR', fallback='gemini'))
+        self.archivo = config.get('BACKEND', 'ARCHIVO_GRABACION', fallback='database/grabacion.jsonl')
+        os.makedirs(os.path.dirname(self.archivo) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+
+    def ajustes(self, suborgano: str) -> dict:
+        return self.interno.ajustes(suborgano)
+
+    def _registrar(self, suborgano, prompt, historial_contexto, temperatura, respuesta, latencia):
+        registro = {"s": suborgano, "h": _huella(suborgano, prompt, historial_contexto, temperatura), "r": respuesta, "l": round(latencia, 4)}
+        linea = json.dumps(registro, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            with open(self.archivo, 'a', encoding='utf-8') as f:
+                f.write(linea + "\n")
+
+    def generar(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        inicio = time.perf_counter()
+        respuesta = self.interno.generar(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+        self._registrar(suborgano, prompt, historial_contexto, temperatura, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    def generar_stream(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None):
+        inicio = time.perf_counter()
+        fragmentos = []
+        for fragmento in self.interno.generar_stream(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura):
+            fragmentos.append(fragmento)
+            yield fragmento
+        self._registrar(suborgano, prompt, historial_contexto, temperatura, "".join(fragmentos), time.perf_counter() - inicio)
+
+    async def generar_async(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        inicio = time.perf_counter()
+        respuesta = await self.interno.generar_async(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+        self._registrar(suborgano, prompt, historial_contexto, temperatura, respuesta, time.perf_counter() - inicio)
+        return respuesta
+
+    def cerrar(self):
+        self.interno.cerrar()
+
+
+class BackendReproduccion(BackendLLM):
+    """
+    Reproduce una grabación de forma determinista y sin red. Cada prompt se
+    busca primero por su huella exacta; si no aparece (p. ej. el contexto
+    cambió), se usa la siguiente respuesta grabada de ese subórgano en orden.
+    La latencia es la grabada o un valor fijo (BACKEND.LATENCIA_REPRODUCCION).
+    """
+
+    nombre = "reproducir"
+
+    def __init__(self, config):
+        super().__init__(config)
+        archivo = config.get('BACKEND', 'ARCHIVO_GRABACION', fallback='database/grabacion.jsonl')
+        latencia = config.get('BACKEND', 'LATENCIA_REPRODUCCION', fallback='grabada').strip().lower()
+        self.latencia_fija = None if latencia == 'grabada' else float(latencia)
+        self._lock = threading.Lock()
+        self._por_huella = collections.defaultdict(collections.deque)
+        self._por_suborgano = collections.defaultdict(list)
+        self._posicion = collections.Counter()
+
+        with open(archivo, 'r', encoding='utf-8') as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                registro = json.loads(linea)
+                self._por_huella[registro["h"]].append(registro)
+                self._por_suborgano[registro["s"]].append(registro)
+
+    def _siguiente(self, suborgano: str, prompt: str, historial_contexto: list = None, temperatura: float = None) -> dict:
+        with self._lock:
+            cola = self._por_huella.get(_huella(suborgano, prompt, historial_contexto, temperatura))
+            if cola:
+                # La última respuesta de una huella se repite si se pide más veces
+                return cola.popleft() if len(cola) > 1 else cola[0]
+            grabados = self._por_suborgano.get(suborgano)
+            if not grabados:
+                raise KeyError(f"La grabación no contiene respuestas para {suborgano}")
+            registro = grabados[self._posicion[suborgano] % len(grabados)]
+            self._posicion[suborgano] += 1
+            return registro
+
+    def _latencia(self, registro: dict) -> float:
+        return self.latencia_fija if self.latencia_fija is not None else registro.get("l", 0.0)
+
+    def generar(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        registro = self._siguiente(suborgano, prompt, historial_contexto, temperatura)
+        time.sleep(self._latencia(registro))
+        return registro["r"]
+
+    async def generar_async(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        registro = self._siguiente(suborgano, prompt, historial_contexto, temperatura)
+        await asyncio.sleep(self._latencia(registro))
+        return registro["r"]
@@ -0,0 +1,258 @@
+# src/backends/stub.py
+#
+# Servidor local que imita al LLM con respuestas JSON deterministas por
+# subórgano, y el backend que lo consume por HTTP. Para levantarlo:
+#     python -m src.backends.stub --puerto 8765 --latencia 0.2
+
+import argparse
+import asyncio
+import hashlib
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.backends.base import BackendLLM
+from src.contexto import estimar_tokens
+
+
+def _extraer_mision(prompt: str) -> str:
+    inicio = prompt.rfind("<MISION>")
+    fin = prompt.rfind("</MISION>")
+    if inicio == -1 or fin == -1:
+        return prompt[-200:]
+    return prompt[inicio + len("<MISION>"):fin]
+
+
+def respuesta_simulada(suborgano: str, prompt: str, temperatura: float = None) -> str:
+    """
+    Respuesta determinista con la forma JSON que espera el agente de cada
+    subórgano. Una temperatura explícita cambia la semilla, así que los
+    candidatos del modo exploración reciben respuestas distintas.
+    """
+    mision = _extraer_mision(prompt)
+    material = prompt if temperatura is None else f"{prompt}\n{temperatura}"
+    semilla = int(hashlib.sha256(material.encode('utf-8')).hexdigest()[:8], 16)
+
+    if suborgano == "EGOS":
+        if mision.startswith("El usuario ha dicho"):
+            data = {"accion": "RESPONDER", "contenido": f"Responder al usuario: {mision[20:120]}"}
+        elif mision.startswith("CONS ha propuesto"):
+            data = {"acciones": [
+                {"accion": "FORMULAR_RESPUESTA", "contenido": f"Respuesta simulada ({semilla % 1000})."},
+                {"accion": "FORMULAR_PREGUNTA_AL_USUARIO", "contenido": "¿Quieres profundizar en algún punto?"}
+            ]}
+        else:
+            data = {"accion": "DESARROLLAR_PENSAMIENTO", "contenido": f"Desarrollar: {mision[:120]}"}
+    elif suborgano == "CONS":
+        data = {"acción": "PENSAR_EN_SILENCIO", "contenido": f"Pensamiento simulado {semilla % 1000} sobre: {mision[:120]}"}
+    elif mision.startswith("Elige"):
+        data = {"accion": "ELEGIR_CANDIDATO", "contenido": str(1 + semilla % max(1, prompt.count("<CANDIDATO ")))}
+    else:
+        if semilla % 3 == 0:
+            data = {"accion": "NUEVA_IDEA", "contenido": f"Idea simulada {semilla % 1000}"}
+        else:
+            data = {"accion": "SIN_IDEAS", "contenido": "Nada nuevo."}
+    return json.dumps(data, ensure_ascii=False)
+
+
+def uso_estimado(prompt: str, instruccion_sistema: str, respuesta: str) -> dict:
+    """Uso de tokens aproximado, con la forma de usage_metadata, para los backends sin proveedor real."""
+    return {"entrada": estimar_tokens(prompt) + (estimar_tokens(instruccion_sistema) if instruccion_sistema else 0),
+            "salida": estimar_tokens(respuesta)}
+
+
+def _id_instruccion(instruccion_sistema: str) -> str:
+    return hashlib.sha256(instruccion_sistema.encode('utf-8')).hexdigest()[:16]
+
+
+class _ManejadorStub(BaseHTTPRequestHandler):
+    """
+    POST /sistema registra una instrucción de sistema y devuelve su id (como un
+    contexto cacheado del proveedor); POST /generar acepta "sistema_id" y
+    responde 404 si el id no está registrado (p. ej. tras reiniciar el stub).
+    """
+    protocol_version = "HTTP/1.1"
+    latencia = 0.0
+    instrucciones = None  # id -> texto, compartido por todas las conexiones
+
+    def _responder(self, estado: int, datos: dict):
+        cuerpo = json.dumps(datos).encode('utf-8')
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_POST(self):
+        largo = int(self.headers.get("Content-Length", 0))
+        pedido = json.loads(self.rfile.read(largo) or b"{}")
+        if self.path == "/sistema":
+            texto = pedido.get("texto", "")
+            self.instrucciones[_id_instruccion(texto)] = texto
+            self._responder(200, {"id": _id_instruccion(texto)})
+            return
+        sistema_id = pedido.get("sistema_id")
+        if sistema_id and sistema_id not in self.instrucciones:
+            self._responder(404, {"error": f"instrucción de sistema desconocida: {sistema_id}"})
+            return
+        time.sleep(self.latencia)
+        texto = respuesta_simulada(pedido.get("suborgano", ""), pedido.get("prompt", ""), pedido.get("temperatura"))
+        uso = uso_estimado(pedido.get("prompt", ""), self.instrucciones.get(sistema_id), texto)
+        self._responder(200, {"texto": texto, "uso": uso})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def servir(host: str = "127.0.0.1", puerto: int = 8765, latencia: float = 0.0) -> ThreadingHTTPServer:
+    """Crea el servidor stub (sin arrancarlo); llamar a serve_forever() sobre el resultado."""
+    manejador = type("ManejadorStub", (_ManejadorStub,), {"latencia": latencia, "instrucciones": {}})
+    return ThreadingHTTPServer((host, puerto), manejador)
+
+
+class ErrorStub(Exception):
+    """Error del stub o inyectado por BackendSimulado, con el código HTTP en .code como las excepciones de google.api_core."""
+
+    def __init__(self, code: int, mensaje: str = "error simulado"):
+        super().__init__(f"{code} {mensaje}")
+        self.code = code
+
+
+class BackendSimulado(BackendLLM):
+    """
+    Variante en proceso del stub, sin HTTP: misma respuesta_simulada con una
+    latencia configurable (BACKEND.LATENCIA_SIMULADA ± BACKEND.JITTER_SIMULADO).
+    Con BACKEND.TASA_ERRORES_SIMULADA > 0 una fracción de las llamadas falla
+    con 429 o 503, para probar reintentos y disyuntor.
+    Útil para benchmarks y pruebas de carga del bucle completo.
+    """
+
+    nombre = "simulado"
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._azar = random.Random(config.getint('BACKEND', 'SEMILLA_SIMULADA', fallback=0))
+        self.actualizar(config)
+
+    def actualizar(self, config) -> bool:
+        self.config = config
+        self.latencia = config.getfloat('BACKEND', 'LATENCIA_SIMULADA', fallback=0.0)
+        self.jitter = config.getfloat('BACKEND', 'JITTER_SIMULADO', fallback=0.0)
+        self.tasa_errores = config.getfloat('BACKEND', 'TASA_ERRORES_SIMULADA', fallback=0.0)
+        return True
+
+    def _espera(self) -> float:
+        return max(0.0, self.latencia + self._azar.uniform(-self.jitter, self.jitter))
+
+    def _responder(self, suborgano: str, prompt: str, instruccion_sistema: str, temperatura: float) -> str:
+        texto = respuesta_simulada(suborgano, prompt, temperatura)
+        uso = uso_estimado(prompt, instruccion_sistema, texto)
+        self.registrar_uso(suborgano, uso["entrada"], uso["salida"])
+        return texto
+
+    def _fallar_al_azar(self):
+        if self.tasa_errores > 0 and self._azar.random() < self.tasa_errores:
+            raise ErrorStub(self._azar.choice((429, 503)))
+
+    def generar(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        time.sleep(self._espera())
+        self._fallar_al_azar()
+        return self._responder(suborgano, prompt, instruccion_sistema, temperatura)
+
+    def generar_stream(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None):
+        # El primer fragmento llega tras un tercio de la latencia; el resto se reparte
+        texto = respuesta_simulada(suborgano, prompt, temperatura)
+        espera = self._espera()
+        fragmentos = [texto[i:i + 16] for i in range(0, len(texto), 16)]
+        time.sleep(espera / 3)
+        self._fallar_al_azar()
+        for fragmento in fragmentos:
+            yield fragmento
+            time.sleep(2 * espera / 3 / len(fragmentos))
+        uso = uso_estimado(prompt, instruccion_sistema, texto)
+        self.registrar_uso(suborgano, uso["entrada"], uso["salida"])
+
+    async def generar_async(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        await asyncio.sleep(self._espera())
+        self._fallar_al_azar()
+        return self._responder(suborgano, prompt, instruccion_sistema, temperatura)
+
+
+class BackendStub(BackendLLM):
+    """
+    Cliente del servidor stub local. Reutiliza una conexión HTTP por hilo. Cada
+    instrucción de sistema se registra una sola vez (POST /sistema) y las
+    llamadas solo envían su id.
+    """
+
+    nombre = "stub"
+
+    def __init__(self, config):
+        super().__init__(config)
+        url = urllib.parse.urlparse(config.get('BACKEND', 'STUB_URL', fallback='http://127.0.0.1:8765'))
+        self.host = url.hostname
+        self.puerto = url.port or 80
+        self._local = threading.local()
+        self._registradas = set()
+
+    def _conexion(self) -> http.client.HTTPConnection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=60)
+            self._local.conexion = conexion
+        return conexion
+
+    def _post(self, ruta: str, datos: dict) -> tuple:
+        cuerpo = json.dumps(datos, default=str)
+        conexion = self._conexion()
+        try:
+            conexion.request("POST", ruta, body=cuerpo, headers={"Content-Type": "application/json"})
+            respuesta = conexion.getresponse()
+            return respuesta.status, json.loads(respuesta.read())
+        except (http.client.HTTPException, ConnectionError):
+            conexion.close()
+            self._local.conexion = None
+            raise
+
+    def _registrar_instruccion(self, instruccion_sistema: str) -> str:
+        sistema_id = _id_instruccion(instruccion_sistema)
+        if sistema_id not in self._registradas:
+            self._post("/sistema", {"texto": instruccion_sistema})
+            self._registradas.add(sistema_id)
+        return sistema_id
+
+    def generar(self, suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None, temperatura: float = None) -> str:
+        pedido = {"suborgano": suborgano, "prompt": prompt, "historial": historial_contexto or []}
+        if temperatura is not None:
+            pedido["temperatura"] = temperatura
+        if instruccion_sistema:
+            pedido["sistema_id"] = self._registrar_instruccion(instruccion_sistema)
+        estado, datos = self._post("/generar", pedido)
+        if estado == 404 and instruccion_sistema:
+            # El servidor perdió el registro: se vuelve a subir la instrucción
+            self._registradas.discard(pedido["sistema_id"])
+            pedido["sistema_id"] = self._registrar_instruccion(instruccion_sistema)
+            estado, datos = self._post("/generar", pedido)
+        if estado != 200:
+            raise ErrorStub(estado, datos.get("error", "error del stub"))
+        uso = datos.get("uso") or {}
+        self.registrar_uso(suborgano, uso.get("entrada", 0), uso.get("salida", 0))
+        return datos["texto"]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor LLM stub para pruebas offline de NeoC")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Segundos de latencia simulada por llamada")
+    args = parser.parse_args()
+
+    servidor = servir(args.host, args.puerto, args.latencia)
+    print(f"Servidor stub escuchando en http://{args.host}:{args.puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
@@ -0,0 +1,343 @@
+# src/benchmark.py
+#
+# Banco de pruebas de rendimiento de NeoC. Conduce un Agencont sin interfaz
+# contra el backend simulado (o el proveedor que se indique) y mide:
+#   - duración de ciclos autónomos y ciclos por segundo
+#   - latencia por subórgano
+#   - tiempo hasta la primera respuesta de cada turno de conversación
+#   - tamaño de prompts (bytes y tokens estimados) turno a turno
+#   - tasa de fallos al extraer JSON
+#   - llamadas fallidas tras reintentos (con --errores se inyectan 429/503)
+#   - tokens de directiva que viajan fuera del prompt (DIRECTIVAS.MODO)
+#   - con --candidatos, alternativas encoladas por el modo exploración de CONS
+# Uso:
+#     python -m src.benchmark --ciclos 20 --latencia 0.2 --salida resultados.json
+#     python -m src.benchmark --comparar resultados_anteriores.json
+
+import argparse
+import concurrent.futures
+import configparser
+import json
+import math
+import os
+import platform
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from src.agent import Agencont
+from src.contexto import estimar_tokens
+from src.llm_handler import CONFIG_PATH, registro_modelos
+from src.metricas import CANDIDATOS_CONS
+from src.resiliencia import ErrorLLM
+
+GUION_POR_DEFECTO = [
+    "Hola, ¿quién eres?",
+    "¿Qué entiendes por conciencia?",
+    "¿Puedes recordar lo que te dije al principio?",
+    "Explícame cómo piensas, paso a paso.",
+    "¿Qué opinas de la creatividad en las máquinas?",
+    "Resume nuestra conversación en una frase.",
+]
+
+
+def percentiles(valores: list) -> dict:
+    """p50/p95/p99 (rango más cercano), media y extremos de una lista de valores."""
+    if not valores:
+        return {"n": 0}
+    ordenados = sorted(valores)
+
+    def rango(p):
+        # Rango más cercano: el menor valor con al menos el p% de la muestra a su izquierda o igual
+        indice = max(0, math.ceil(p * len(ordenados) / 100) - 1)
+        return ordenados[indice]
+
+    return {
+        "n": len(ordenados),
+        "media": sum(ordenados) / len(ordenados),
+        "min": ordenados[0],
+        "p50": rango(50),
+        "p95": rango(95),
+        "p99": rango(99),
+        "max": ordenados[-1],
+    }
+
+
+class _ColaMedida(queue.Queue):
+    """Cola de salida que anota cuándo llega cada mensaje de respuesta (completo o parcial)."""
+
+    def __init__(self):
+        super().__init__()
+        self.respuestas = []
+
+    def put(self, item, block=True, timeout=None):
+        if isinstance(item, dict) and item.get("type") in ("response", "response_delta"):
+            self.respuestas.append(time.perf_counter())
+        super().put(item, block, timeout)
+
+
+class AgenteMedido(Agencont):
+    """Agencont instrumentado: mide cada llamada al LLM (la extracción de JSON ya la cuenta Agencont)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.llamadas = []
+        self.fase = "inicio"
+        self._lock_medidas = threading.Lock()
+        motor_enviar = self.motor.enviar
+        motor_enviar_lote = self.motor.enviar_lote
+        motor_enviar_stream = self.motor.enviar_stream
+
+        def medir(futuro, llamadas):
+            inicio = time.perf_counter()
+            registros = [{
+                "fase": self.fase,
+                "suborgano": suborgano,
+                "prompt_bytes": len(prompt.encode('utf-8')),
+                "prompt_tokens_est": estimar_tokens(prompt),
+                "memoria_corto_plazo": len(self.memoria_corto_plazo),
+                "turno": self.turno,
+            } for suborgano, prompt in llamadas]
+
+            def al_terminar(f):
+                # En un lote cada llamada se mide con la latencia del lote completo
+                for registro in registros:
+                    registro["latencia"] = time.perf_counter() - inicio
+                with self._lock_medidas:
+                    self.llamadas.extend(registros)
+
+            futuro.add_done_callback(al_terminar)
+            return futuro
+
+        def enviar_medido(suborgano, prompt, *a, **kw):
+            return medir(motor_enviar(suborgano, prompt, *a, **kw), [(suborgano, prompt)])
+
+        def enviar_lote_medido(llamadas, *a, **kw):
+            return medir(motor_enviar_lote(llamadas, *a, **kw), [(ll["suborgano"], ll["prompt"]) for ll in llamadas])
+
+        def enviar_stream_medido(suborgano, prompt, *a, **kw):
+            return medir(motor_enviar_stream(suborgano, prompt, *a, **kw), [(suborgano, prompt)])
+
+        self.motor.enviar = enviar_medido
+        self.motor.enviar_lote = enviar_lote_medido
+        self.motor.enviar_stream = enviar_stream_medido
+
+
+def _config_temporal(args, directorio: str) -> str:
+    """Copia config.ini con el backend, la latencia y la caché (en directorio) del benchmark; devuelve la ruta."""
+    config = configparser.ConfigParser()
+    config.read(CONFIG_PATH)
+    if not config.has_section('BACKEND'):
+        config.add_section('BACKEND')
+    config['BACKEND']['PROVEEDOR'] = args.proveedor
+    config['BACKEND']['LATENCIA_SIMULADA'] = str(args.latencia)
+    config['BACKEND']['JITTER_SIMULADO'] = str(args.jitter)
+    config['BACKEND']['TASA_ERRORES_SIMULADA'] = str(args.errores)
+    if not config.has_section('CACHE'):
+        config.add_section('CACHE')
+    config['CACHE']['HABILITADO'] = 'true' if args.cache else 'false'
+    config['CACHE']['RUTA'] = os.path.join(directorio, 'neoc_cache.db')
+    # La cuota de config.ini es la del proveedor real; el benchmark usa la indicada (0 = sin límite)
+    if not config.has_section('LIMITES'):
+        config.add_section('LIMITES')
+    config['LIMITES']['RPM'] = str(args.rpm)
+    config['LIMITES']['TPM'] = '0'
+    if args.directivas:
+        if not config.has_section('DIRECTIVAS'):
+            config.add_section('DIRECTIVAS')
+        config['DIRECTIVAS']['MODO'] = args.directivas
+    descriptor, ruta = tempfile.mkstemp(prefix="neoc_bench_", suffix=".ini")
+    with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+        config.write(f)
+    return ruta
+
+
+def _version() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocida"
+
+
+def ejecutar(args) -> dict:
+    # Memoria, caché y logs en un directorio temporal: el benchmark no toca database/ ni logs/
+    directorio = tempfile.TemporaryDirectory(prefix="neoc_bench_")
+    ruta_config = _config_temporal(args, directorio.name)
+    config_original = registro_modelos.config_path
+    registro_modelos.config_path = ruta_config
+    try:
+        salida = _ColaMedida()
+        agente = AgenteMedido(
+            input_queue=queue.Queue(), output_queue=salida,
+            dir_logs=os.path.join(directorio.name, 'logs'), dir_datos=os.path.join(directorio.name, 'database')
+        )
+        agente.log_settings.update({"flujo": False, "prompts": False, "conversacion": False})
+        if args.modo:
+            agente.modo_ciclo = args.modo
+        if args.directivas:
+            agente.modo_directivas = args.directivas
+        if args.candidatos:
+            agente.candidatos_cons = args.candidatos
+        if args.ranking:
+            agente.ranking_exploracion = args.ranking
+
+        # --- Ciclos autónomos ---
+        agente.fase = "ciclo"
+        duraciones_ciclo = []
+        pensamiento = "Que es NeoC?"
+        inicio_total = time.perf_counter()
+        for _ in range(args.ciclos):
+            inicio = time.perf_counter()
+            try:
+                pensamiento = agente._ciclo_interno(pensamiento)
+            except ErrorLLM as e:
+                agente._registrar_error_llm(e)
+            duraciones_ciclo.append(time.perf_counter() - inicio)
+        total_ciclos = time.perf_counter() - inicio_total
+        concurrent.futures.wait(agente.subcon_pendientes)
+        agente._recoger_subcon_pendientes()
+
+        # --- Conversación guionada ---
+        agente.fase = "conversacion"
+        guion = GUION_POR_DEFECTO
+        if args.guion:
+            with open(args.guion, 'r', encoding='utf-8') as f:
+                guion = [linea.strip() for linea in f if linea.strip()]
+        turnos = []
+        for turno in range(args.repeticiones):
+            for mensaje in guion:
+                previas = len(salida.respuestas)
+                inicio = time.perf_counter()
+                try:
+                    agente.manejar_conversacion_externa(mensaje)
+                except ErrorLLM as e:
+                    agente._registrar_error_llm(e)
+                fin = time.perf_counter()
+                primera = salida.respuestas[previas] - inicio if len(salida.respuestas) > previas else None
+                turnos.append({
+                    "memoria_corto_plazo": len(agente.memoria_corto_plazo),
+                    "duracion": fin - inicio,
+                    "primera_respuesta": primera,
+                })
+        agente.cerrar()
+    finally:
+        registro_modelos.config_path = config_original
+        os.remove(ruta_config)
+        directorio.cleanup()
+
+    por_suborgano = {}
+    for suborgano in sorted({ll["suborgano"] for ll in agente.llamadas}):
+        llamadas = [ll for ll in agente.llamadas if ll["suborgano"] == suborgano]
+        por_suborgano[suborgano] = {
+            "latencia": percentiles([ll["latencia"] for ll in llamadas]),
+            "prompt_bytes": percentiles([ll["prompt_bytes"] for ll in llamadas]),
+            "prompt_tokens_est": percentiles([ll["prompt_tokens_est"] for ll in llamadas]),
+        }
+
+    # Crecimiento del prompt turno a turno (llamadas de conversación)
+    crecimiento = {}
+    for ll in agente.llamadas:
+        if ll["fase"] == "conversacion":
+            crecimiento.setdefault(ll["turno"], []).append(ll["prompt_bytes"])
+
+    return {
+        "fecha": datetime.now().isoformat(timespec='seconds'),
+        "version": _version(),
+        "python": platform.python_version(),
+        "parametros": {
+            "proveedor": args.proveedor, "latencia": args.latencia, "jitter": args.jitter, "errores": args.errores,
+            "ciclos": args.ciclos, "repeticiones": args.repeticiones, "modo": agente.modo_ciclo,
+            "cache": args.cache, "rpm": args.rpm, "directivas": agente.modo_directivas,
+            "candidatos_cons": agente.candidatos_cons, "ranking": agente.ranking_exploracion,
+        },
+        "ciclos": {
+            "duracion": percentiles(duraciones_ciclo),
+            "ciclos_por_segundo": (args.ciclos / total_ciclos) if total_ciclos else 0.0,
+        },
+        "conversacion": {
+            "duracion_turno": percentiles([t["duracion"] for t in turnos]),
+            "tiempo_primera_respuesta": percentiles([t["primera_respuesta"] for t in turnos if t["primera_respuesta"] is not None]),
+            "turnos_sin_respuesta": sum(1 for t in turnos if t["primera_respuesta"] is None),
+        },
+        "suborganos": por_suborgano,
+        "crecimiento_prompt_bytes": {str(k): max(v) for k, v in sorted(crecimiento.items())},
+        "json": {
+            "extracciones": agente.extracciones_json,
+            "fallos": sum(agente.fallos_json.values()),
+            "fallos_por_suborgano": dict(agente.fallos_json),
+            "tasa_fallos": (sum(agente.fallos_json.values()) / agente.extracciones_json) if agente.extracciones_json else 0.0,
+        },
+        "errores_llm": dict(agente.errores_llm),
+        "exploracion": {
+            "alternativas_encoladas": CANDIDATOS_CONS.suma(sesion=agente.sesion, resultado="alternativa"),
+            "candidatos_invalidos": CANDIDATOS_CONS.suma(sesion=agente.sesion, resultado="invalido"),
+        },
+        "directivas": {
+            "modo": agente.modo_directivas,
+            "tokens_fuera_del_prompt": sum(agente.tokens_directiva_ahorrados.values()),
+            "por_suborgano": dict(agente.tokens_directiva_ahorrados),
+        },
+    }
+
+
+def _imprimir(resultado: dict, anterior: dict = None):
+    def fila(nombre, actual, previo=None):
+        texto = f"  {nombre:<34} p50={actual.get('p50', 0):9.4f}  p95={actual.get('p95', 0):9.4f}  p99={actual.get('p99', 0):9.4f}"
+        if previo and previo.get("p50"):
+            texto += f"  (p50 {100 * (actual['p50'] - previo['p50']) / previo['p50']:+.1f}%)"
+        print(texto)
+
+    previo = anterior or {}
+    print(f"NeoC benchmark {resultado['fecha']} (versión {resultado['version']}) {resultado['parametros']}")
+    print(f"  ciclos/segundo: {resultado['ciclos']['ciclos_por_segundo']:.3f}")
+    fila("duración de ciclo (s)", resultado["ciclos"]["duracion"], previo.get("ciclos", {}).get("duracion"))
+    fila("duración de turno (s)", resultado["conversacion"]["duracion_turno"], previo.get("conversacion", {}).get("duracion_turno"))
+    fila("tiempo a primera respuesta (s)", resultado["conversacion"]["tiempo_primera_respuesta"], previo.get("conversacion", {}).get("tiempo_primera_respuesta"))
+    for suborgano, datos in resultado["suborganos"].items():
+        previo_sub = previo.get("suborganos", {}).get(suborgano, {})
+        fila(f"{suborgano} latencia (s)", datos["latencia"], previo_sub.get("latencia"))
+        fila(f"{suborgano} prompt (bytes)", datos["prompt_bytes"], previo_sub.get("prompt_bytes"))
+    print(f"  crecimiento del prompt (turno -> bytes): {resultado['crecimiento_prompt_bytes']}")
+    print(f"  fallos de JSON: {resultado['json']['fallos']}/{resultado['json']['extracciones']} ({100 * resultado['json']['tasa_fallos']:.1f}%)")
+    if resultado.get("errores_llm"):
+        print(f"  llamadas fallidas tras reintentos: {resultado['errores_llm']}")
+    exploracion = resultado.get("exploracion", {})
+    if resultado["parametros"].get("candidatos_cons", 1) > 1:
+        print(f"  exploración de CONS: {exploracion.get('alternativas_encoladas', 0):.0f} alternativas encoladas, {exploracion.get('candidatos_invalidos', 0):.0f} candidatos inválidos")
+    directivas = resultado.get("directivas", {})
+    print(f"  directivas (modo {directivas.get('modo')}): {directivas.get('tokens_fuera_del_prompt', 0)} tokens estimados fuera del prompt")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de ciclos y turnos de conversación de NeoC")
+    parser.add_argument("--proveedor", default="simulado", help="Backend a usar (por defecto: simulado)")
+    parser.add_argument("--latencia", type=float, default=0.2, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Variación de la latencia simulada (s)")
+    parser.add_argument("--errores", type=float, default=0.0, help="Fracción de llamadas simuladas que fallan con 429/503")
+    parser.add_argument("--rpm", type=float, default=0.0, help="Cuota de solicitudes por minuto por modelo (0 = sin límite)")
+    parser.add_argument("--ciclos", type=int, default=20, help="Número de ciclos autónomos")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Veces que se repite el guion de conversación")
+    parser.add_argument("--guion", help="Archivo con un mensaje de usuario por línea")
+    parser.add_argument("--modo", choices=["secuencial", "pipeline"], help="Modo de ciclo (por defecto el de config.ini)")
+    parser.add_argument("--cache", action="store_true", help="Habilitar la caché de respuestas")
+    parser.add_argument("--directivas", choices=["prompt", "sistema", "cache"], help="Cómo se envían las directivas (por defecto el de config.ini)")
+    parser.add_argument("--candidatos", type=int, help="Candidatos de CONS por ciclo (por defecto EXPLORACION.CANDIDATOS)")
+    parser.add_argument("--ranking", choices=["heuristica", "subcon"], help="Ranking de los candidatos de CONS (por defecto el de config.ini)")
+    parser.add_argument("--salida", help="Ruta del JSON de resultados")
+    parser.add_argument("--comparar", help="JSON de una ejecución anterior para mostrar variaciones")
+    args = parser.parse_args()
+
+    resultado = ejecutar(args)
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            anterior = json.load(f)
+    _imprimir(resultado, anterior)
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.salida}")
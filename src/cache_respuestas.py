@@ -0,0 +1,72 @@
+# src/cache_respuestas.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class CacheRespuestas:
+    """
+    Caché persistente prompt -> respuesta en SQLite, pensada para subórganos de
+    baja temperatura (CONS). La clave combina modelo, ajustes de generación,
+    prompt e historial; cada entrada expira según el TTL del subórgano y, al
+    superar el máximo de entradas, se desalojan las de uso más antiguo (LRU).
+    """
+
+    def __init__(self, ruta: str = 'database/neoc_cache.db', max_entradas: int = 5000):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        self.max_entradas = max_entradas
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS respuestas ("
+            "clave TEXT PRIMARY KEY, suborgano TEXT, respuesta TEXT, creado REAL, ultimo_uso REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_uso ON respuestas (ultimo_uso)")
+        self._conn.commit()
+
+    @staticmethod
+    def clave(ajustes: dict, prompt: str, historial_contexto: list = None) -> str:
+        """Hash estable de (modelo + ajustes de generación, prompt, historial)."""
+        h_prompt = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        h_historial = hashlib.sha256(
+            json.dumps(historial_contexto or [], sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        material = json.dumps([ajustes, h_prompt, h_historial], sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def obtener(self, clave: str, ttl: float):
+        """Devuelve la respuesta cacheada si existe y no expiró; si no, None."""
+        ahora = time.time()
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT respuesta, creado FROM respuestas WHERE clave = ?", (clave,)
+            ).fetchone()
+            if fila is None or ahora - fila[1] > ttl:
+                self.fallos += 1
+                return None
+            self._conn.execute("UPDATE respuestas SET ultimo_uso = ? WHERE clave = ?", (ahora, clave))
+            self._conn.commit()
+            self.aciertos += 1
+            return fila[0]
+
+    def guardar(self, clave: str, suborgano: str, respuesta: str):
+        ahora = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO respuestas (clave, suborgano, respuesta, creado, ultimo_uso) VALUES (?, ?, ?, ?, ?)",
+                (clave, suborgano, respuesta, ahora, ahora)
+            )
+            total = self._conn.execute("SELECT COUNT(*) FROM respuestas").fetchone()[0]
+            if total > self.max_entradas:
+                self._conn.execute(
+                    "DELETE FROM respuestas WHERE clave IN "
+                    "(SELECT clave FROM respuestas ORDER BY ultimo_uso ASC LIMIT ?)",
+                    (total - self.max_entradas,)
+                )
+            self._conn.commit()
@@ -0,0 +1,99 @@
+# src/contexto.py
+
+from src.extraccion_json import extraer_json
+
+# Aproximación de tokens sin tokenizador (≈4 caracteres por token en español)
+CARACTERES_POR_TOKEN = 4
+
+
+def estimar_tokens(texto: str) -> int:
+    return max(1, len(texto) // CARACTERES_POR_TOKEN)
+
+
+class GestorContexto:
+    """
+    Memoria de corto plazo acotada por tokens. Cada subórgano recibe una
+    ventana con los turnos más recientes que caben en su presupuesto, precedida
+    por un resumen incremental de los turnos más antiguos. El resumen se pide
+    al LLM en segundo plano (la función resumir devuelve un Future) y se
+    incorpora cuando termina; el conteo de tokens de cada turno se calcula una
+    sola vez al agregarlo.
+    """
+
+    def __init__(self, presupuestos: dict, resumir=None, lote_resumen: int = 300, max_tokens_resumen: int = 300):
+        self.presupuestos = presupuestos
+        self.resumir = resumir
+        self.lote_resumen = lote_resumen
+        self.max_tokens_resumen = max_tokens_resumen
+        self.turnos = []  # [(texto, tokens)] del más antiguo al más reciente
+        self.primer_turno = 0  # Número global de turnos[0]; crece cuando el resumen absorbe turnos
+        self.resumen = ""
+        self._resumen_pendiente = None  # (Future, cantidad de turnos que resume)
+
+    def __len__(self):
+        return len(self.turnos)
+
+    def agregar(self, texto: str):
+        self._incorporar_resumen()
+        self.turnos.append((texto, estimar_tokens(texto)))
+        self._programar_resumen()
+
+    def _ventana(self, presupuesto: int) -> int:
+        """Índice del primer turno que entra en la ventana del presupuesto."""
+        disponible = presupuesto - (estimar_tokens(self.resumen) if self.resumen else 0)
+        inicio = len(self.turnos)
+        while inicio > 0 and self.turnos[inicio - 1][1] <= disponible:
+            inicio -= 1
+            disponible -= self.turnos[inicio][1]
+        return inicio
+
+    def contexto(self, suborgano: str) -> str:
+        """Contexto para el subórgano: resumen de lo antiguo + turnos recientes dentro de su presupuesto."""
+        self._incorporar_resumen()
+        presupuesto = self.presupuestos.get(suborgano, max(self.presupuestos.values()))
+        recientes = [texto for texto, _ in self.turnos[self._ventana(presupuesto):]]
+        if self.resumen:
+            recientes.insert(0, f"[Resumen de la conversación anterior] {self.resumen}")
+        return "\n".join(recientes)
+
+    def _programar_resumen(self):
+        if self.resumir is None or self._resumen_pendiente is not None:
+            return
+        # Turnos que ya no entran en la ventana más amplia
+        fuera = self._ventana(max(self.presupuestos.values()))
+        if fuera == 0 or sum(tokens for _, tokens in self.turnos[:fuera]) < self.lote_resumen:
+            return
+        antiguos = "\n".join(texto for texto, _ in self.turnos[:fuera])
+        palabras = self.max_tokens_resumen * CARACTERES_POR_TOKEN // 6
+        prompt = (
+            f"<RESUMEN_ANTERIOR>{self.resumen}</RESUMEN_ANTERIOR>\n"
+            f"<TURNOS_NUEVOS>{antiguos}</TURNOS_NUEVOS>\n"
+            f"<MISION>Actualiza el resumen anterior incorporando los turnos nuevos. "
+            f"Conserva hechos, nombres y preguntas abiertas. Máximo {palabras} palabras. "
+            f"Devuelve un JSON con la clave \"contenido\".</MISION>"
+        )
+        self._resumen_pendiente = (self.resumir(prompt), fuera)
+
+    def _incorporar_resumen(self):
+        if self._resumen_pendiente is None or not self._resumen_pendiente[0].done():
+            return
+        futuro, cantidad = self._resumen_pendiente
+        self._resumen_pendiente = None
+        # Un fallo del LLM llega como excepción del Future (ErrorLLM), no como texto;
+        # los turnos quedan sin resumir hasta el próximo intento
+        if futuro.cancelled() or futuro.exception() is not None:
+            return
+        texto = futuro.result()
+        resultado = extraer_json(texto)
+        if resultado.ok:
+            texto = str(resultado.datos.get("contenido", texto))
+        self.resumen = texto[:self.max_tokens_resumen * CARACTERES_POR_TOKEN]
+        del self.turnos[:cantidad]
+        self.primer_turno += cantidad
+        self._programar_resumen()
+
+    def restaurar(self, turnos: list, resumen: str = "", primer_turno: int = 0):
+        """Recupera la memoria guardada en un punto de control (ver src/estado.py)."""
+        self.turnos = [(texto, estimar_tokens(texto)) for texto in turnos]
+        self.resumen = resumen
+        self.primer_turno = primer_turno
@@ -0,0 +1,95 @@
+# src/estado.py
+
+import json
+import queue
+import sqlite3
+import threading
+
+
+class EstadoAgente:
+    """
+    Puntos de control del estado de trabajo de un Agencont en SQLite:
+    pensamiento actual, ideas subconscientes, contadores y memoria de corto
+    plazo (resumen y turnos). Son incrementales: cada valor se reescribe solo
+    si cambió desde el punto anterior, y de los turnos se agregan los nuevos y
+    se borran los que el resumen ya absorbió (cada turno tiene un número
+    global que no se reutiliza). Como en MemoriaLargoPlazo, la escritura la
+    hace un hilo de fondo y el agente nunca espera al disco.
+    """
+
+    def __init__(self, ruta: str = 'database/neoc_estado.db', reanudar: bool = True):
+        self.ruta = ruta
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS estado (clave TEXT PRIMARY KEY, valor TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS turnos_corto_plazo (id INTEGER PRIMARY KEY, texto TEXT)")
+        if not reanudar:
+            self._conn.execute("DELETE FROM estado")
+            self._conn.execute("DELETE FROM turnos_corto_plazo")
+        self._conn.commit()
+
+        # Lo último enviado al escritor, para calcular solo las diferencias
+        self._valores = {}  # clave -> JSON
+        self._primer_turno = 0
+        self._siguiente_turno = 0
+
+        self._pendientes = queue.Queue()
+        self._escritor = threading.Thread(target=self._bucle_escritor, name="NeoC_Estado", daemon=True)
+        self._escritor.start()
+
+    def cargar(self):
+        """
+        Último punto de control confirmado: (valores, turnos, primer_turno),
+        donde primer_turno es el número global de turnos[0]; None si no hay
+        ninguno. Llamar antes del primer guardar().
+        """
+        valores = dict(self._conn.execute("SELECT clave, valor FROM estado").fetchall())
+        filas = self._conn.execute("SELECT id, texto FROM turnos_corto_plazo ORDER BY id").fetchall()
+        if not valores and not filas:
+            return None
+        self._valores = valores
+        self._primer_turno = filas[0][0] if filas else 0
+        self._siguiente_turno = filas[-1][0] + 1 if filas else 0
+        return {clave: json.loads(valor) for clave, valor in valores.items()}, [texto for _, texto in filas], self._primer_turno
+
+    def guardar(self, valores: dict, turnos: list, primer_turno: int) -> bool:
+        """
+        Encola un punto de control con los valores (serializables a JSON) y los
+        textos de la memoria de corto plazo, cuyo primero tiene el número
+        global primer_turno. Devuelve False si nada cambió.
+        """
+        cambios = {}
+        for clave, valor in valores.items():
+            serializado = json.dumps(valor, ensure_ascii=False)
+            if self._valores.get(clave) != serializado:
+                cambios[clave] = serializado
+        desde = max(0, self._siguiente_turno - primer_turno)
+        nuevos = [(primer_turno + i, texto) for i, texto in enumerate(turnos[desde:], desde)]
+        descartar_hasta = primer_turno if primer_turno > self._primer_turno else None
+        if not cambios and not nuevos and descartar_hasta is None:
+            return False
+
+        self._valores.update(cambios)
+        self._primer_turno = primer_turno
+        self._siguiente_turno = max(self._siguiente_turno, primer_turno + len(turnos))
+        self._pendientes.put((cambios, nuevos, descartar_hasta))
+        return True
+
+    def _bucle_escritor(self):
+        while True:
+            item = self._pendientes.get()
+            if item is None:
+                return
+            cambios, nuevos, descartar_hasta = item
+            with self._conn:  # Un punto de control es una sola transacción
+                self._conn.executemany("INSERT OR REPLACE INTO estado (clave, valor) VALUES (?, ?)", cambios.items())
+                if descartar_hasta is not None:
+                    self._conn.execute("DELETE FROM turnos_corto_plazo WHERE id < ?", (descartar_hasta,))
+                self._conn.executemany("INSERT OR REPLACE INTO turnos_corto_plazo (id, texto) VALUES (?, ?)", nuevos)
+
+    def cerrar(self):
+        """Confirma los puntos de control pendientes y cierra la conexión."""
+        self._pendientes.put(None)
+        self._escritor.join(timeout=5)
+        self._conn.close()
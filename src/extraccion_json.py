@@ -0,0 +1,102 @@
+# src/extraccion_json.py
+
+import json
+from typing import NamedTuple, Optional
+
+# Forma JSON esperada de cada subórgano, en el subconjunto OpenAPI que aceptan
+# los proveedores con salida estructurada (SETTINGS_<SUBORGANO>.JSON_MODE).
+_ACCION = {
+    "type": "OBJECT",
+    "properties": {
+        "accion": {"type": "STRING"},
+        "contenido": {"type": "STRING"},
+    },
+    "required": ["accion", "contenido"],
+}
+
+ESQUEMAS_SUBORGANO = {
+    "EGOS": {
+        "type": "OBJECT",
+        "properties": {
+            "accion": {"type": "STRING"},
+            "contenido": {"type": "STRING"},
+            "acciones": {"type": "ARRAY", "items": _ACCION},
+        },
+    },
+    "CONS": _ACCION,
+    "SUBCON": {
+        "type": "OBJECT",
+        "properties": {
+            # ELEGIR_CANDIDATO: ranking del modo exploración (contenido = número del candidato)
+            "accion": {"type": "STRING", "enum": ["NUEVA_IDEA", "SIN_IDEAS", "ELEGIR_CANDIDATO"]},
+            "contenido": {"type": "STRING"},
+        },
+        "required": ["accion", "contenido"],
+    },
+}
+
+
+class ResultadoJSON(NamedTuple):
+    datos: Optional[dict]
+    texto: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.datos is not None
+
+
+def extraer_json(texto: str) -> ResultadoJSON:
+    """
+    Extrae el primer objeto JSON válido de un texto en una sola pasada.
+    Recorre el texto una vez siguiendo la profundidad de llaves (ignorando las
+    que aparecen dentro de cadenas) y valida con json.loads solo cada objeto
+    completo y balanceado. Si un candidato no es válido, la búsqueda continúa
+    después de él, así que el costo total sigue siendo lineal. Cubre también
+    los bloques ```json, cuyo contenido se encuentra en el mismo recorrido.
+    Si no encuentra un objeto, el error indica el motivo.
+    """
+    if not texto:
+        return ResultadoJSON(None, texto or "", "respuesta vacía")
+
+    errores = []
+    profundidad = 0
+    inicio = -1
+    en_cadena = False
+    escapado = False
+    for i, char in enumerate(texto):
+        if profundidad == 0:
+            if char == '{':
+                profundidad = 1
+                inicio = i
+            continue
+        if en_cadena:
+            if escapado:
+                escapado = False
+            elif char == '\\':
+                escapado = True
+            elif char == '"':
+                en_cadena = False
+            continue
+        if char == '"':
+            en_cadena = True
+        elif char == '{':
+            profundidad += 1
+        elif char == '}':
+            profundidad -= 1
+            if profundidad == 0:
+                candidato = texto[inicio:i + 1]
+                try:
+                    datos = json.loads(candidato)
+                except json.JSONDecodeError as e:
+                    errores.append(f"JSON inválido en la posición {inicio + e.pos}: {e.msg}")
+                    continue
+                if isinstance(datos, dict):
+                    return ResultadoJSON(datos, candidato)
+                errores.append(f"el JSON en la posición {inicio} no es un objeto")
+
+    if profundidad > 0:
+        errores.append(f"objeto JSON incompleto desde la posición {inicio} (¿respuesta truncada por MAX_OUTPUT_TOKENS?)")
+    if not errores:
+        errores.append("no hay ningún objeto JSON en la respuesta")
+    return ResultadoJSON(None, texto, "; ".join(errores))
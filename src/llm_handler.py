@@ -1,58 +1,427 @@
 # src/llm_handler.py
 
+import asyncio
 import configparser
-import google.generativeai as genai
+import hashlib
 import os
-from dotenv import load_dotenv
+import threading
+import time
+import weakref
+from src.backends import crear_backend
+from src.cache_respuestas import CacheRespuestas
+from src.contexto import estimar_tokens
+from src.metricas import (
+    CACHE_RESPUESTAS, CIRCUITO_ABIERTO, ESPERA_CUOTA_LLM, LATENCIA_LLM, LLAMADAS_LLM,
+    PRIMER_FRAGMENTO_LLM, REINTENTOS_LLM, metricas
+)
+from src.registro import logger_llm
+from src.resiliencia import CircuitoAbierto, ControlModelo, ErrorConfiguracionLLM, clasificar_error
 
-# Carga las variables del archivo .env al entorno
-load_dotenv()
+CONFIG_PATH = 'config.ini'
 
-def llamar_a_gemini(suborgano: str, prompt: str, historial_contexto: list = None):
+
+def _cargar_entorno():
     """
-    Se comunica con la API de Gemini, cargando la API Key de forma segura
-    y configurando el modelo, la temperatura y el máximo de tokens de salida
-    según el subórgano especificado.
+    Carga las variables del archivo .env al entorno. Se hace al construir el
+    primer backend y no al importar el módulo, para no demorar el arranque;
+    sin python-dotenv solo cuentan las variables de entorno ya definidas.
     """
     try:
-        # 1. Leer la configuración general desde config.ini
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+class RegistroModelos:
+    """
+    Registro de larga vida del proveedor de LLM configurado (BACKEND.PROVEEDOR).
+    El backend conserva sus modelos y transportes por subórgano entre llamadas.
+    Si cambia config.ini solo se renuevan sus ajustes (backend.actualizar);
+    se reconstruye, y el SDK se vuelve a configurar, solo cuando cambian el
+    proveedor o la API_KEY. El SDK del proveedor se importa al construirlo
+    (ver precalentar).
+    """
+
+    def __init__(self, config_path: str = CONFIG_PATH):
+        self.config_path = config_path
+        self._lock = threading.Lock()
+        self._firma = None
+        self._identidad = None  # (proveedor, API_KEY) del backend vigente
+        self._config = None
+        self._backend = None
+        self._cache = None
+        self._controles = {}
+        # Protege solo a _controles: las métricas los leen sin esperar a _lock,
+        # que se retiene mientras se construye el backend (importar el SDK)
+        self._lock_controles = threading.Lock()
+        self._entorno_cargado = False
+
+    def _firma_actual(self):
+        try:
+            mtime = os.stat(self.config_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        return (mtime, os.getenv("API_KEY"))
+
+    def _recargar_si_cambio(self):
+        if not self._entorno_cargado:
+            _cargar_entorno()
+            self._entorno_cargado = True
+        firma = self._firma_actual()
+        if firma == self._firma:
+            return
+
         config = configparser.ConfigParser()
-        config.read('config.ini')
+        config.read(self.config_path)
+        identidad = (config.get('BACKEND', 'PROVEEDOR', fallback='gemini').strip().lower(), firma[1])
+
+        if self._backend is None or identidad != self._identidad or not self._backend.actualizar(config):
+            try:
+                backend = crear_backend(config)
+            except Exception as e:
+                # Proveedor desconocido, API_KEY ausente, SDK no instalado, archivo de grabación inexistente...
+                raise ErrorConfiguracionLLM(f"No se pudo construir el proveedor de LLM '{identidad[0]}': {e}") from e
+            if self._backend is not None:
+                self._backend.cerrar()
+            self._backend = backend
+            self._identidad = identidad
+
+        self._config = config
+        self._firma = firma
+        # Los controles se conservan (cuota consumida, disyuntor); solo se refrescan sus límites
+        for control in self._controles.values():
+            control.actualizar(config)
+
+    def ajuste(self, seccion: str, clave: str, por_defecto: str) -> str:
+        """Lee un ajuste opcional de config.ini (recargado si cambió)."""
+        with self._lock:
+            self._recargar_si_cambio()
+            return self._config.get(seccion, clave, fallback=por_defecto)
+
+    def backend(self):
+        """Devuelve el backend vigente, recargando la configuración si cambió."""
+        with self._lock:
+            self._recargar_si_cambio()
+            return self._backend
+
+    def ajustes_modelo(self, suborgano: str, instruccion_sistema: str = None, temperatura: float = None) -> dict:
+        """
+        Modelo y ajustes de generación vigentes del subórgano (parte de la
+        clave de caché), junto con la huella de su instrucción de sistema y
+        la temperatura propia de la llamada, si la tiene.
+        """
+        ajustes = dict(self.backend().ajustes(suborgano))
+        if temperatura is not None:
+            ajustes["temperature"] = temperatura
+        if instruccion_sistema:
+            ajustes["instruccion_sistema"] = hashlib.sha256(instruccion_sistema.encode('utf-8')).hexdigest()
+        return ajustes
+
+    def precalentar(self):
+        """
+        Construye el backend por adelantado (importa y configura el SDK del
+        proveedor), p. ej. en un hilo mientras abre la interfaz, para que la
+        primera llamada no pague ese costo. Los errores se informan y se
+        repetirán como ErrorConfiguracionLLM en la primera llamada.
+        """
+        try:
+            self.backend()
+        except Exception as e:
+            logger_llm().warning(f"No se pudo preparar el proveedor de LLM: {e}")
+
+    def control(self, modelo: str) -> ControlModelo:
+        """Cuota, reintentos y disyuntor del modelo (LIMITES en config.ini), compartidos por todas las llamadas."""
+        with self._lock:
+            self._recargar_si_cambio()
+            control = self._controles.get(modelo)
+            if control is None:
+                control = ControlModelo(modelo, self._config)
+                with self._lock_controles:
+                    self._controles[modelo] = control
+            return control
 
-        # 2. Cargar la API Key de forma segura desde el archivo .env
-        api_key = os.getenv("API_KEY")
-        if not api_key:
-            raise ValueError("No se encontró la API_KEY en el archivo .env o en las variables de entorno.")
+    def instantanea(self) -> tuple:
+        """(controles, caché) vigentes, sin bloquearse mientras se construye el backend."""
+        with self._lock_controles:
+            return list(self._controles.values()), self._cache
 
-        # 3. Seleccionar dinámicamente los parámetros del subórgano
-        model_name = config['MODELS'][f'{suborgano}_MODEL']
-        temperature = float(config[f'SETTINGS_{suborgano}']['TEMPERATURE'])
-        max_tokens = int(config[f'SETTINGS_{suborgano}']['MAX_OUTPUT_TOKENS'])
+    def cache(self, suborgano: str):
+        """
+        Devuelve (cache, ttl) si la caché de respuestas está habilitada en
+        config.ini y el subórgano tiene TTL positivo; si no, (None, 0).
+        """
+        if self.ajuste('CACHE', 'HABILITADO', 'false').strip().lower() not in ('1', 'true', 'si', 'sí', 'yes'):
+            return None, 0
+        ttl = float(self.ajuste('CACHE', f'TTL_{suborgano}', '0'))
+        if ttl <= 0:
+            return None, 0
+        with self._lock:
+            if self._cache is None:
+                self._cache = CacheRespuestas(
+                    self._config.get('CACHE', 'RUTA', fallback='database/neoc_cache.db'),
+                    self._config.getint('CACHE', 'MAX_ENTRADAS', fallback=5000)
+                )
+            return self._cache, ttl
 
-        # 4. Configurar la API de Gemini
-        genai.configure(api_key=api_key)
-        
-        generation_config = genai.GenerationConfig(
-            temperature=temperature,
-            max_output_tokens=max_tokens
-        )
 
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config
-        )
+registro_modelos = RegistroModelos()
 
-        # 5. Enviar el prompt y devolver la respuesta
-        chat = model.start_chat(history=historial_contexto if historial_contexto else [])
-        response = chat.send_message(prompt)
 
-        return response.text
+def _recolectar_metricas():
+    controles, cache = registro_modelos.instantanea()
+    for control in controles:
+        CIRCUITO_ABIERTO.fijar(1 if control.disyuntor.abierto else 0, modelo=control.modelo)
+    if cache is not None:
+        CACHE_RESPUESTAS.fijar(cache.aciertos, resultado="acierto")
+        CACHE_RESPUESTAS.fijar(cache.fallos, resultado="fallo")
 
+
+metricas.registrar_colector(_recolectar_metricas)
+
+
+def _preparar(suborgano: str, prompt: str, historial_contexto: list, instruccion_sistema: str) -> tuple:
+    """Backend vigente, control de cuota del modelo del subórgano y tokens estimados de la solicitud."""
+    try:
+        backend = registro_modelos.backend()
+        modelo = backend.ajustes(suborgano)["modelo"]
     except KeyError as e:
-        error_message = f"Error de configuración para {suborgano}: no se encontró la clave {e} en config.ini"
-        print(error_message)
-        return error_message
-    except Exception as e:
-        error_message = f"Error al llamar a la API de Gemini para {suborgano}: {e}"
-        print(error_message)
-        return error_message
\ No newline at end of file
+        raise clasificar_error(e, suborgano) from e
+    except (ValueError, ErrorConfiguracionLLM) as e:
+        # El backend no se pudo construir o un ajuste del subórgano no es válido
+        raise ErrorConfiguracionLLM(f"Error de configuración para {suborgano}: {e}", suborgano) from e
+    tokens = estimar_tokens(prompt) + (estimar_tokens(instruccion_sistema) if instruccion_sistema else 0)
+    if historial_contexto:
+        tokens += estimar_tokens(str(historial_contexto))
+    return backend, registro_modelos.control(modelo), tokens
+
+
+def _buscar_en_cache(suborgano: str, prompt: str, historial_contexto: list, instruccion_sistema: str, temperatura: float) -> tuple:
+    """(cache, clave, respuesta cacheada o None); cache es None si está deshabilitada para el subórgano."""
+    cache, ttl = registro_modelos.cache(suborgano)
+    if not cache:
+        return None, None, None
+    clave = cache.clave(registro_modelos.ajustes_modelo(suborgano, instruccion_sistema, temperatura), prompt, historial_contexto)
+    return cache, clave, cache.obtener(clave, ttl)
+
+
+def cuota_por_minuto(suborgano: str) -> tuple:
+    """(modelo, RPM de LIMITES) del subórgano; (None, 0) si el proveedor no está configurado."""
+    try:
+        modelo = registro_modelos.backend().ajustes(suborgano)["modelo"]
+    except (KeyError, ValueError, ErrorConfiguracionLLM):
+        return None, 0.0
+    return modelo, registro_modelos.control(modelo).cubo.rpm
+
+
+# --- Contabilidad común de los tres modos de llamada ---
+
+def _reservar(control: ControlModelo, suborgano: str, tokens: int) -> float:
+    """Verifica el disyuntor y reserva cuota; devuelve la espera previa a la llamada."""
+    try:
+        espera = control.antes_de_llamar(suborgano, tokens)
+    except CircuitoAbierto as e:
+        LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado=type(e).__name__)
+        raise
+    if espera:
+        ESPERA_CUOTA_LLM.inc(espera, modelo=control.modelo)
+    return espera
+
+
+def _fallo(control: ControlModelo, error: Exception, suborgano: str, intento: int) -> tuple:
+    """(ErrorLLM, espera antes de reintentar o None si la llamada se da por fallida)."""
+    error_llm, espera = control.tras_fallo(error, suborgano, intento)
+    if espera is None:
+        LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado=type(error_llm).__name__)
+        logger_llm().error(str(error_llm))
+    else:
+        REINTENTOS_LLM.inc(modelo=control.modelo, motivo=type(error_llm).__name__)
+        logger_llm().warning(f"{error_llm} (reintento {intento + 1} en {espera:.1f}s)")
+    return error_llm, espera
+
+
+def _exito(control: ControlModelo, suborgano: str, inicio: float):
+    control.tras_exito()
+    LATENCIA_LLM.observar(time.monotonic() - inicio, suborgano=suborgano, modelo=control.modelo)
+    LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado="ok")
+
+
+def llamar_a_gemini(suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None,
+                    temperatura: float = None):
+    """
+    Se comunica con el proveedor de LLM configurado (Gemini por defecto; ver
+    RegistroModelos y src/backends) usando la temperatura y el máximo de
+    tokens de salida del subórgano especificado en config.ini (temperatura,
+    si se indica, reemplaza la del subórgano en esta llamada). La
+    instrucción de sistema (directiva del subórgano) viaja fuera del prompt.
+    Respeta la cuota del modelo y reintenta los errores transitorios; si la
+    llamada no se puede completar lanza un ErrorLLM (ver src/resiliencia).
+    """
+    backend, control, tokens = _preparar(suborgano, prompt, historial_contexto, instruccion_sistema)
+    cache, clave, cacheada = _buscar_en_cache(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+    if cacheada is not None:
+        LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado="cache")
+        return cacheada
+
+    inicio = time.monotonic()
+    intento = 0
+    while True:
+        time.sleep(_reservar(control, suborgano, tokens))
+        try:
+            texto = backend.generar(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+            break
+        except Exception as e:
+            error, espera = _fallo(control, e, suborgano, intento)
+            if espera is None:
+                raise error from e
+            time.sleep(espera)
+            intento += 1
+    _exito(control, suborgano, inicio)
+
+    if cache:
+        cache.guardar(clave, suborgano, texto)
+    return texto
+
+
+def llamar_a_gemini_stream(suborgano: str, prompt: str, historial_contexto: list = None, instruccion_sistema: str = None,
+                           temperatura: float = None):
+    """
+    Variante en streaming de llamar_a_gemini: generador que entrega la
+    respuesta en fragmentos a medida que el proveedor los produce. Solo se
+    reintenta si el error llega antes del primer fragmento; después se lanza
+    el ErrorLLM, porque quien consume ya recibió parte de la respuesta.
+    """
+    backend, control, tokens = _preparar(suborgano, prompt, historial_contexto, instruccion_sistema)
+    cache, clave, cacheada = _buscar_en_cache(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+    if cacheada is not None:
+        LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado="cache")
+        yield cacheada
+        return
+
+    inicio = time.monotonic()
+    intento = 0
+    fragmentos = []
+    while True:
+        time.sleep(_reservar(control, suborgano, tokens))
+        try:
+            for fragmento in backend.generar_stream(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura):
+                if not fragmentos:
+                    PRIMER_FRAGMENTO_LLM.observar(time.monotonic() - inicio, suborgano=suborgano, modelo=control.modelo)
+                fragmentos.append(fragmento)
+                yield fragmento
+            break
+        except Exception as e:
+            # Con fragmentos ya entregados no se reintenta (intento fuera de rango)
+            error, espera = _fallo(control, e, suborgano, control.reintentos if fragmentos else intento)
+            if espera is None:
+                raise error from e
+            time.sleep(espera)
+            intento += 1
+    _exito(control, suborgano, inicio)
+
+    if cache:
+        cache.guardar(clave, suborgano, "".join(fragmentos))
+
+
+# --- Variante asíncrona ---
+# Un semáforo por nombre de modelo limita cuántas llamadas simultáneas recibe
+# cada modelo. Un asyncio.Semaphore queda ligado al event loop donde se usa,
+# así que hay un juego por loop (p. ej. uno por MotorLLM), creado de forma
+# perezosa y liberado junto con el loop.
+_semaforos = weakref.WeakKeyDictionary()  # loop -> {modelo: Semaphore}
+
+
+def _semaforo_modelo(model_name: str) -> asyncio.Semaphore:
+    semaforos = _semaforos.setdefault(asyncio.get_running_loop(), {})
+    semaforo = semaforos.get(model_name)
+    if semaforo is None:
+        limite = int(registro_modelos.ajuste('MOTOR', 'CONCURRENCIA_POR_MODELO', '2'))
+        semaforo = asyncio.Semaphore(limite)
+        semaforos[model_name] = semaforo
+    return semaforo
+
+
+async def llamar_a_gemini_async(suborgano: str, prompt: str, historial_contexto: list = None, timeout: float = None,
+                                instruccion_sistema: str = None, temperatura: float = None):
+    """
+    Contraparte asíncrona de llamar_a_gemini. Respeta la cuota y el límite de
+    concurrencia por modelo y un timeout por intento (por defecto MOTOR.TIMEOUT
+    de config.ini). Las esperas de cuota y de reintento no ocupan el semáforo.
+    La cancelación de la tarea se propaga (asyncio.CancelledError) para que
+    quien llama pueda descartar una llamada en curso.
+    """
+    backend, control, tokens = _preparar(suborgano, prompt, historial_contexto, instruccion_sistema)
+    if timeout is None:
+        timeout = float(registro_modelos.ajuste('MOTOR', 'TIMEOUT', '60'))
+    cache, clave, cacheada = _buscar_en_cache(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+    if cacheada is not None:
+        LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado="cache")
+        return cacheada
+
+    inicio = time.monotonic()
+    intento = 0
+    while True:
+        await asyncio.sleep(_reservar(control, suborgano, tokens))
+        try:
+            async with _semaforo_modelo(control.modelo):
+                texto = await asyncio.wait_for(backend.generar_async(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura), timeout)
+            break
+        except Exception as e:
+            error, espera = _fallo(control, e, suborgano, intento)
+            if espera is None:
+                raise error from e
+            await asyncio.sleep(espera)
+            intento += 1
+    _exito(control, suborgano, inicio)
+
+    if cache:
+        cache.guardar(clave, suborgano, texto)
+    return texto
+
+
+async def llamar_a_gemini_stream_async(suborgano: str, prompt: str, historial_contexto: list = None, timeout: float = None,
+                                       instruccion_sistema: str = None, temperatura: float = None):
+    """
+    Contraparte asíncrona de llamar_a_gemini_stream (generador asíncrono).
+    Ocupa el semáforo del modelo durante todo el stream y el timeout vale
+    para cada fragmento. El stream del backend es síncrono: cada fragmento
+    se pide en un executor para no bloquear el event loop.
+    """
+    backend, control, tokens = _preparar(suborgano, prompt, historial_contexto, instruccion_sistema)
+    if timeout is None:
+        timeout = float(registro_modelos.ajuste('MOTOR', 'TIMEOUT', '60'))
+    cache, clave, cacheada = _buscar_en_cache(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+    if cacheada is not None:
+        LLAMADAS_LLM.inc(suborgano=suborgano, modelo=control.modelo, resultado="cache")
+        yield cacheada
+        return
+
+    loop = asyncio.get_running_loop()
+    inicio = time.monotonic()
+    intento = 0
+    fragmentos = []
+    while True:
+        await asyncio.sleep(_reservar(control, suborgano, tokens))
+        try:
+            async with _semaforo_modelo(control.modelo):
+                iterador = backend.generar_stream(suborgano, prompt, historial_contexto, instruccion_sistema, temperatura)
+                while True:
+                    fragmento = await asyncio.wait_for(loop.run_in_executor(None, next, iterador, None), timeout)
+                    if fragmento is None:
+                        break
+                    if not fragmentos:
+                        PRIMER_FRAGMENTO_LLM.observar(time.monotonic() - inicio, suborgano=suborgano, modelo=control.modelo)
+                    fragmentos.append(fragmento)
+                    yield fragmento
+            break
+        except Exception as e:
+            # Con fragmentos ya entregados no se reintenta (intento fuera de rango)
+            error, espera = _fallo(control, e, suborgano, control.reintentos if fragmentos else intento)
+            if espera is None:
+                raise error from e
+            await asyncio.sleep(espera)
+            intento += 1
+    _exito(control, suborgano, inicio)
+
+    if cache:
+        cache.guardar(clave, suborgano, "".join(fragmentos))
@@ -0,0 +1,138 @@
+# src/memoria.py
+
+import queue
+import re
+import sqlite3
+import threading
+
+
+# Palabras funcionales del español que no aportan a la búsqueda: unidas con OR
+# harían coincidir casi cualquier recuerdo
+PALABRAS_VACIAS = frozenset("""
+    una uno unos unas los las del con por para que qué como cómo cuando cuándo donde dónde
+    este esta esto estos estas ese esa eso esos esas aquel aquella sus suyo tus mis nos
+    les más menos muy pero sin sobre entre hasta desde hacia tras ante bajo según
+    hay fue fueron ser son era eran está están estar sido han has hemos haber
+    ya aún también tan tanto cada otro otra otros otras todo toda todos todas
+    algo alguno alguna nada ningún ninguna mismo misma sólo solo bien así
+    qué cuál cuáles quién quiénes porque pues sino aunque
+""".split())
+
+
+class MemoriaLargoPlazo:
+    """
+    Memoria de largo plazo de NeoC sobre SQLite (tabla memoria_largo_plazo).
+    - Índice FTS5 sobre el contenido e índices por timestamp y tipo.
+    - Modo WAL: las lecturas no esperan a las escrituras.
+    - Las escrituras se encolan y un hilo de fondo las confirma en lotes,
+      así el bucle del agente nunca espera al disco.
+    - buscar() devuelve los k recuerdos más relevantes para una consulta.
+    """
+
+    def __init__(self, ruta: str = 'database/neoc_memory.db', tamano_lote: int = 64, intervalo_lote: float = 0.5):
+        self.ruta = ruta
+        self.tamano_lote = tamano_lote
+        self.intervalo_lote = intervalo_lote
+
+        # Conexiones separadas: el hilo escritor confirma lotes mientras las
+        # búsquedas leen la última versión confirmada (WAL).
+        self._conn_escritura = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn_escritura.execute("PRAGMA journal_mode=WAL")
+        self._conn_escritura.execute("PRAGMA synchronous=NORMAL")
+        self._crear_esquema()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._lock_lectura = threading.Lock()
+
+        self._pendientes = queue.Queue()
+        self._escritor = threading.Thread(target=self._bucle_escritor, name="NeoC_MemoriaLP", daemon=True)
+        self._escritor.start()
+
+    def _crear_esquema(self):
+        cursor = self._conn_escritura.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS memoria_largo_plazo (id INTEGER PRIMARY KEY, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, contenido TEXT, tipo TEXT)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_memoria_timestamp ON memoria_largo_plazo (timestamp)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_memoria_tipo_timestamp ON memoria_largo_plazo (tipo, timestamp)")
+
+        existia_fts = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'memoria_fts'"
+        ).fetchone()
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS memoria_fts USING fts5("
+            "contenido, content='memoria_largo_plazo', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS memoria_fts_insertar AFTER INSERT ON memoria_largo_plazo BEGIN "
+            "INSERT INTO memoria_fts(rowid, contenido) VALUES (new.id, new.contenido); END"
+        )
+        cursor.execute(
+            "CREATE TRIGGER IF NOT EXISTS memoria_fts_borrar AFTER DELETE ON memoria_largo_plazo BEGIN "
+            "INSERT INTO memoria_fts(memoria_fts, rowid, contenido) VALUES ('delete', old.id, old.contenido); END"
+        )
+        if not existia_fts:
+            # Indexa las filas que existieran antes de crear el índice
+            cursor.execute("INSERT INTO memoria_fts(memoria_fts) VALUES ('rebuild')")
+        self._conn_escritura.commit()
+
+    def guardar(self, contenido: str, tipo: str):
+        """Encola un recuerdo; se escribe en el próximo lote del hilo de fondo."""
+        if contenido:
+            self._pendientes.put((str(contenido), tipo))
+
+    def pendientes(self) -> int:
+        """Recuerdos encolados que el hilo escritor aún no confirmó."""
+        return self._pendientes.qsize()
+
+    def _bucle_escritor(self):
+        while True:
+            item = self._pendientes.get()
+            if item is None:
+                return
+            lote = [item]
+            cerrar = False
+            while len(lote) < self.tamano_lote:
+                try:
+                    item = self._pendientes.get(timeout=self.intervalo_lote)
+                except queue.Empty:
+                    break
+                if item is None:
+                    cerrar = True
+                    break
+                lote.append(item)
+            self._conn_escritura.executemany("INSERT INTO memoria_largo_plazo (contenido, tipo) VALUES (?, ?)", lote)
+            self._conn_escritura.commit()
+            if cerrar:
+                return
+
+    @staticmethod
+    def _consulta_fts(texto: str) -> str:
+        # Cada palabra se cita para que FTS5 no la interprete como operador
+        palabras = {p for p in re.findall(r'\w+', texto.lower()) if len(p) > 2 and p not in PALABRAS_VACIAS}
+        return " OR ".join(f'"{p}"' for p in sorted(palabras))
+
+    def buscar(self, consulta: str, k: int = 5, tipos: list = None) -> list:
+        """Devuelve hasta k recuerdos (dict con contenido, tipo y timestamp) ordenados por relevancia."""
+        consulta_fts = self._consulta_fts(consulta)
+        if not consulta_fts or k <= 0:
+            return []
+        sql = (
+            "SELECT m.contenido, m.tipo, m.timestamp FROM memoria_fts "
+            "JOIN memoria_largo_plazo m ON m.id = memoria_fts.rowid "
+            "WHERE memoria_fts MATCH ?"
+        )
+        parametros = [consulta_fts]
+        if tipos:
+            sql += f" AND m.tipo IN ({', '.join('?' for _ in tipos)})"
+            parametros.extend(tipos)
+        sql += " ORDER BY bm25(memoria_fts) LIMIT ?"
+        parametros.append(k)
+        with self._lock_lectura:
+            filas = self._conn.execute(sql, parametros).fetchall()
+        return [{"contenido": c, "tipo": t, "timestamp": ts} for c, t, ts in filas]
+
+    def cerrar(self):
+        """Confirma los recuerdos pendientes y cierra la conexión."""
+        self._pendientes.put(None)
+        self._escritor.join(timeout=5)
+        self._conn_escritura.close()
+        with self._lock_lectura:
+            self._conn.close()
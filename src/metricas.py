@@ -0,0 +1,256 @@
+# src/metricas.py
+#
+# Instrumentación de NeoC: contadores, medidores e histogramas en memoria con
+# exposición en formato de texto de Prometheus. Sin dependencias externas.
+# Las métricas son de proceso: en el servidor de sesiones las del agente
+# llevan la etiqueta "sesion".
+#     python main.py            -> http://127.0.0.1:9464/metrics (METRICAS en config.ini)
+#     python -m src.servidor    -> GET /metrics en el mismo puerto de la API
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CUBETAS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CUBETAS_CICLO = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formato(valor: float) -> str:
+    if valor == float('inf'):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class _Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+        self._series = {}  # tupla de valores de etiquetas -> valor
+
+    def _clave(self, etiquetas: dict) -> tuple:
+        return tuple(str(etiquetas.get(e, "")) for e in self.etiquetas)
+
+    def _coincide(self, clave: tuple, filtro: dict) -> bool:
+        return all(clave[self.etiquetas.index(e)] == str(v) for e, v in filtro.items())
+
+    def _etiquetas_texto(self, clave: tuple, extra: dict = None) -> str:
+        pares = list(zip(self.etiquetas, clave)) + list((extra or {}).items())
+        if not pares:
+            return ""
+        return "{" + ",".join(f'{e}="{_escapar(v)}"' for e, v in pares) + "}"
+
+    def quitar(self, **etiquetas):
+        """Elimina las series que coinciden con el filtro (p. ej. al cerrar una sesión)."""
+        with self._lock:
+            for clave in [c for c in self._series if self._coincide(c, etiquetas)]:
+                del self._series[clave]
+
+    def suma(self, **filtro) -> float:
+        """Suma de las series cuyas etiquetas coinciden con el filtro."""
+        with self._lock:
+            return sum(v for c, v in self._series.items() if self._coincide(c, filtro))
+
+    def lineas(self) -> list:
+        with self._lock:
+            series = list(self._series.items())
+        return [f"{self.nombre}{self._etiquetas_texto(c)} {_formato(v)}" for c, v in series]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def fijar(self, valor: float, **etiquetas):
+        with self._lock:
+            self._series[self._clave(etiquetas)] = valor
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), cubetas: tuple = CUBETAS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.cubetas = tuple(sorted(cubetas))
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                # [conteo por cubeta (la última es +Inf), suma, total]
+                serie = self._series[clave] = [[0] * (len(self.cubetas) + 1), 0.0, 0]
+            serie[0][bisect.bisect_left(self.cubetas, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def _combinar(self, filtro: dict) -> list:
+        conteos = [0] * (len(self.cubetas) + 1)
+        suma = total = 0
+        with self._lock:
+            for clave, (cubetas, s, n) in self._series.items():
+                if self._coincide(clave, filtro):
+                    conteos = [a + b for a, b in zip(conteos, cubetas)]
+                    suma += s
+                    total += n
+        return [conteos, suma, total]
+
+    def suma(self, **filtro) -> float:
+        return self._combinar(filtro)[1]
+
+    def cantidad(self, **filtro) -> int:
+        return self._combinar(filtro)[2]
+
+    def percentil(self, p: float, **filtro) -> float:
+        """Percentil estimado por interpolación lineal dentro de la cubeta (como histogram_quantile)."""
+        conteos, _, total = self._combinar(filtro)
+        if not total:
+            return 0.0
+        objetivo = p / 100 * total
+        acumulado = 0
+        for i, conteo in enumerate(conteos):
+            if acumulado + conteo >= objetivo and conteo:
+                inferior = self.cubetas[i - 1] if i > 0 else 0.0
+                if i == len(self.cubetas):
+                    return inferior  # Por encima de la última cubeta finita
+                return inferior + (self.cubetas[i] - inferior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+        return self.cubetas[-1]
+
+    def lineas(self) -> list:
+        with self._lock:
+            series = [(c, (list(b), s, n)) for c, (b, s, n) in self._series.items()]
+        lineas = []
+        for clave, (cubetas, suma, total) in series:
+            acumulado = 0
+            for limite, conteo in zip(self.cubetas + (float('inf'),), cubetas):
+                acumulado += conteo
+                lineas.append(f"{self.nombre}_bucket{self._etiquetas_texto(clave, {'le': _formato(limite)})} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{self._etiquetas_texto(clave)} {_formato(suma)}")
+            lineas.append(f"{self.nombre}_count{self._etiquetas_texto(clave)} {total}")
+        return lineas
+
+
+class RegistroMetricas:
+    """
+    Conjunto de métricas del proceso. Los colectores son funciones que se
+    llaman justo antes de exponer, para actualizar medidores que se leen del
+    estado (profundidad de colas, estado de los disyuntores...).
+    """
+
+    def __init__(self):
+        self._metricas = {}
+        self._colectores = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nombre, metrica)
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: tuple = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def medidor(self, nombre: str, ayuda: str, etiquetas: tuple = ()) -> Medidor:
+        return self._registrar(Medidor(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: tuple = (), cubetas: tuple = CUBETAS_LATENCIA) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, cubetas))
+
+    def registrar_colector(self, colector):
+        with self._lock:
+            self._colectores.append(colector)
+
+    def quitar_colector(self, colector):
+        with self._lock:
+            if colector in self._colectores:
+                self._colectores.remove(colector)
+
+    def recolectar(self):
+        with self._lock:
+            colectores = list(self._colectores)
+        for colector in colectores:
+            colector()
+
+    def exponer(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus (versión 0.0.4)."""
+        self.recolectar()
+        with self._lock:
+            metricas = list(self._metricas.values())
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+        return "\n".join(lineas) + "\n"
+
+
+metricas = RegistroMetricas()
+
+# --- Llamadas al LLM (llm_handler, backends y motor) ---
+LATENCIA_LLM = metricas.histograma("neoc_llm_latencia_segundos", "Duración de las llamadas al LLM completadas, incluidos los reintentos.", ("suborgano", "modelo"))
+PRIMER_FRAGMENTO_LLM = metricas.histograma("neoc_llm_primer_fragmento_segundos", "Tiempo hasta el primer fragmento de las llamadas en streaming.", ("suborgano", "modelo"))
+LLAMADAS_LLM = metricas.contador("neoc_llm_llamadas_total", "Llamadas al LLM por resultado (ok, cache o tipo de error).", ("suborgano", "modelo", "resultado"))
+REINTENTOS_LLM = metricas.contador("neoc_llm_reintentos_total", "Reintentos de llamadas al LLM por motivo.", ("modelo", "motivo"))
+ESPERA_CUOTA_LLM = metricas.contador("neoc_llm_espera_cuota_segundos_total", "Segundos de espera impuestos por el limitador de cuota.", ("modelo",))
+TOKENS_LLM = metricas.contador("neoc_llm_tokens_total", "Tokens según usage_metadata del proveedor (estimados en los backends simulados).", ("suborgano", "modelo", "tipo"))
+CIRCUITO_ABIERTO = metricas.medidor("neoc_llm_circuito_abierto", "1 si el disyuntor del modelo está abierto.", ("modelo",))
+LLAMADAS_EN_CURSO = metricas.medidor("neoc_motor_llamadas_en_curso", "Llamadas programadas en el motor asíncrono que aún no terminaron.")
+CACHE_RESPUESTAS = metricas.medidor("neoc_cache_respuestas", "Aciertos y fallos acumulados de la caché de respuestas.", ("resultado",))
+
+# --- Agente ---
+DURACION_CICLO = metricas.histograma("neoc_ciclo_duracion_segundos", "Duración de los ciclos autónomos EGOS -> CONS -> SUBCON.", ("sesion",), CUBETAS_CICLO)
+CICLOS = metricas.contador("neoc_ciclos_total", "Ciclos autónomos por resultado (ok, interrumpido, fallido).", ("sesion", "resultado"))
+DURACION_TURNO = metricas.histograma("neoc_turno_duracion_segundos", "Duración de la atención de cada mensaje del usuario.", ("sesion",), CUBETAS_CICLO)
+EXTRACCIONES_JSON = metricas.contador("neoc_json_extracciones_total", "Respuestas de las que se intentó extraer un JSON.", ("sesion", "suborgano"))
+FALLOS_JSON = metricas.contador("neoc_json_fallos_total", "Respuestas sin un objeto JSON válido.", ("sesion", "suborgano"))
+CANDIDATOS_CONS = metricas.contador("neoc_cons_candidatos_total", "Candidatos de CONS del modo exploración por destino (elegido, alternativa, invalido, error).", ("sesion", "resultado"))
+PROFUNDIDAD_COLA = metricas.medidor("neoc_cola_profundidad", "Elementos en espera en cada cola del agente.", ("sesion", "cola"))
+
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        responder_metricas(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def responder_metricas(manejador: BaseHTTPRequestHandler):
+    """Escribe la exposición de métricas como respuesta HTTP de un manejador."""
+    cuerpo = metricas.exponer().encode('utf-8')
+    manejador.send_response(200)
+    manejador.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+    manejador.send_header("Content-Length", str(len(cuerpo)))
+    manejador.end_headers()
+    manejador.wfile.write(cuerpo)
+
+
+def servir_metricas(host: str = "127.0.0.1", puerto: int = 9464) -> ThreadingHTTPServer:
+    """Arranca en un hilo de fondo un servidor HTTP con GET /metrics y lo devuelve."""
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="NeoC_Metricas", daemon=True).start()
+    return servidor
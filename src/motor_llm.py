@@ -0,0 +1,78 @@
+# src/motor_llm.py
+
+import asyncio
+import concurrent.futures
+import threading
+from src.llm_handler import llamar_a_gemini_async, llamar_a_gemini_stream_async
+from src.metricas import LLAMADAS_EN_CURSO
+
+
+class MotorLLM:
+    """
+    Motor asíncrono de llamadas al LLM. Mantiene un event loop asyncio en un
+    hilo de fondo y expone las llamadas como concurrent.futures.Future, para
+    que el hilo del agente pueda lanzar varias a la vez, esperarlas o
+    cancelarlas sin convertirse él mismo en código asíncrono.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._hilo = threading.Thread(target=self._loop.run_forever, name="NeoC_MotorLLM", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, suborgano: str, prompt: str, historial_contexto: list = None, timeout: float = None,
+               instruccion_sistema: str = None, temperatura: float = None) -> concurrent.futures.Future:
+        """Programa una llamada y devuelve su Future sin bloquear."""
+        corrutina = llamar_a_gemini_async(suborgano, prompt, historial_contexto, timeout, instruccion_sistema, temperatura)
+        LLAMADAS_EN_CURSO.inc()
+        futuro = asyncio.run_coroutine_threadsafe(corrutina, self._loop)
+        futuro.add_done_callback(lambda f: LLAMADAS_EN_CURSO.inc(-1))
+        return futuro
+
+    def enviar_stream(self, suborgano: str, prompt: str, al_fragmento, historial_contexto: list = None, timeout: float = None,
+                      instruccion_sistema: str = None, temperatura: float = None) -> concurrent.futures.Future:
+        """
+        Programa una llamada en streaming: al_fragmento(fragmento) se invoca
+        en el hilo del motor con cada fragmento a medida que llega. El Future
+        devuelve el texto completo; cancelarlo corta el stream.
+        """
+        async def transmitir():
+            fragmentos = []
+            async for fragmento in llamar_a_gemini_stream_async(suborgano, prompt, historial_contexto, timeout, instruccion_sistema, temperatura):
+                fragmentos.append(fragmento)
+                al_fragmento(fragmento)
+            return "".join(fragmentos)
+
+        LLAMADAS_EN_CURSO.inc()
+        futuro = asyncio.run_coroutine_threadsafe(transmitir(), self._loop)
+        futuro.add_done_callback(lambda f: LLAMADAS_EN_CURSO.inc(-1))
+        return futuro
+
+    def enviar_lote(self, llamadas: list, concurrencia: int = 0) -> concurrent.futures.Future:
+        """
+        Programa un lote de llamadas (cada una un dict con los argumentos de
+        llamar_a_gemini_async) con a lo sumo concurrencia de ellas en vuelo a
+        la vez (0 = sin límite propio; los semáforos por modelo siguen
+        valiendo). Devuelve un único Future con las respuestas en orden; una
+        llamada fallida aporta su excepción en lugar de la respuesta.
+        Cancelarlo cancela todas las llamadas pendientes del lote.
+        """
+        async def lote():
+            limite = asyncio.Semaphore(concurrencia) if concurrencia > 0 else None
+
+            async def una(llamada):
+                if limite is None:
+                    return await llamar_a_gemini_async(**llamada)
+                async with limite:
+                    return await llamar_a_gemini_async(**llamada)
+
+            return await asyncio.gather(*(una(llamada) for llamada in llamadas), return_exceptions=True)
+
+        LLAMADAS_EN_CURSO.inc(len(llamadas))
+        futuro = asyncio.run_coroutine_threadsafe(lote(), self._loop)
+        futuro.add_done_callback(lambda f: LLAMADAS_EN_CURSO.inc(-len(llamadas)))
+        return futuro
+
+    def detener(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._hilo.join(timeout=5)
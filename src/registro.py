@@ -0,0 +1,139 @@
+# src/registro.py
+
+import atexit
+import configparser
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime, timezone
+
+# Campos opcionales que el agente adjunta con extra={...} y que el formato
+# JSONL emite como claves propias.
+CAMPOS_ESTRUCTURADOS = ("suborgano", "ciclo", "latencia", "turno")
+
+_listeners = {}  # nombre del logger -> QueueListener
+_lock_llm = threading.Lock()
+
+
+class FormatoJSONL(logging.Formatter):
+    """Una línea JSON por registro, con los campos estructurados si están presentes."""
+
+    def format(self, record):
+        registro = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for campo in CAMPOS_ESTRUCTURADOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                registro[campo] = valor
+        return json.dumps(registro, ensure_ascii=False)
+
+
+def _nombre_comprimido(nombre: str) -> str:
+    return nombre + ".gz"
+
+
+def _rotar_comprimiendo(origen: str, destino: str):
+    with open(origen, 'rb') as f_in, gzip.open(destino, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(origen)
+
+
+def _handler_archivo(log_file: str, config) -> logging.Handler:
+    rotacion = config.get('LOGS', 'ROTACION', fallback='tamano').strip().lower()
+    cantidad = config.getint('LOGS', 'CANTIDAD_ARCHIVOS', fallback=10)
+    if rotacion == 'tiempo':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_file, when=config.get('LOGS', 'CUANDO', fallback='midnight'),
+            backupCount=cantidad, encoding='utf-8'
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=config.getint('LOGS', 'MAX_BYTES', fallback=10 * 1024 * 1024),
+            backupCount=cantidad, encoding='utf-8'
+        )
+    if config.getboolean('LOGS', 'COMPRIMIR', fallback=True):
+        handler.namer = _nombre_comprimido
+        handler.rotator = _rotar_comprimiendo
+    return handler
+
+
+def configurar_logger(name: str, log_file: str, fmt: str, config, datefmt: str = None, consola: bool = False) -> logging.Logger:
+    """
+    Configura un logger no bloqueante: el logger solo encola registros
+    (QueueHandler) y un QueueListener en segundo plano los escribe en un
+    archivo con rotación por tamaño o tiempo (LOGS.ROTACION), comprimiendo los
+    archivos rotados. Con LOGS.FORMATO = jsonl el archivo se escribe en JSONL.
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    if logger.handlers:
+        return logger
+
+    if config.get('LOGS', 'FORMATO', fallback='texto').strip().lower() == 'jsonl':
+        formatter = FormatoJSONL()
+        log_file = os.path.splitext(log_file)[0] + ".jsonl"
+    else:
+        formatter = logging.Formatter(fmt, datefmt=datefmt)
+
+    file_handler = _handler_archivo(log_file, config)
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+    if consola:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter(fmt, datefmt=datefmt))
+        handlers.append(stream_handler)
+
+    cola = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(cola))
+    listener = logging.handlers.QueueListener(cola, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
+    return logger
+
+
+def logger_llm(config_path: str = 'config.ini', dir_logs: str = 'logs') -> logging.Logger:
+    """
+    Logger del proceso para la capa de LLM (reintentos, fallos, proveedor),
+    compartido por todas las sesiones; se configura en el primer uso. Como
+    los demás, solo encola: no escribe desde el event loop del motor.
+    """
+    with _lock_llm:
+        logger = logging.getLogger("NeoC_LLM")
+        if not logger.handlers:
+            config = configparser.ConfigParser()
+            config.read(config_path)
+            os.makedirs(dir_logs, exist_ok=True)
+            configurar_logger("NeoC_LLM", os.path.join(dir_logs, 'llm.log'), '%(asctime)s - %(levelname)s - %(message)s', config, consola=True)
+        return logger
+
+
+def detener_logger(logger: logging.Logger):
+    """Vacía y detiene el escritor de un logger (p. ej. al cerrar una sesión) y cierra sus archivos."""
+    listener = _listeners.pop(logger.name, None)
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+def detener_registro():
+    """Vacía las colas de log pendientes y detiene los hilos escritores."""
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
+
+
+atexit.register(detener_registro)
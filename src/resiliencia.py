@@ -0,0 +1,262 @@
+# src/resiliencia.py
+
+import asyncio
+import http.client
+import random
+import threading
+import time
+
+
+class ErrorLLM(Exception):
+    """
+    Fallo de una llamada al LLM. Reemplaza a los textos "Error al llamar..."
+    que antes se devolvían como si fueran la respuesta del modelo.
+    reintentable indica si tiene sentido repetir la llamada más tarde.
+    """
+
+    reintentable = False
+
+    def __init__(self, mensaje: str, suborgano: str = None, modelo: str = None):
+        super().__init__(mensaje)
+        self.suborgano = suborgano
+        self.modelo = modelo
+
+
+class ErrorConfiguracionLLM(ErrorLLM):
+    """Falta una clave de config.ini o el proveedor no se puede construir."""
+
+
+class ErrorCuotaLLM(ErrorLLM):
+    """El proveedor rechazó la llamada por cuota (HTTP 429 / ResourceExhausted)."""
+
+    reintentable = True
+
+
+class ErrorTransitorioLLM(ErrorLLM):
+    """Error pasajero del proveedor o de la red: 5xx, timeout, conexión caída."""
+
+    reintentable = True
+
+
+class CircuitoAbierto(ErrorLLM):
+    """El modelo acumuló fallos seguidos; no se le envían llamadas hasta reintentar_en segundos."""
+
+    def __init__(self, mensaje: str, suborgano: str = None, modelo: str = None, reintentar_en: float = 0.0):
+        super().__init__(mensaje, suborgano, modelo)
+        self.reintentar_en = reintentar_en
+
+
+CODIGOS_CUOTA = {429}
+CODIGOS_TRANSITORIOS = {408, 500, 502, 503, 504}
+
+
+def clasificar_error(error: Exception, suborgano: str, modelo: str = None) -> ErrorLLM:
+    """
+    Convierte la excepción de un proveedor en un ErrorLLM tipado. Las
+    excepciones de google.api_core llevan el código HTTP en .code; no se
+    importan aquí para que los proveedores offline no dependan de ellas.
+    """
+    if isinstance(error, ErrorLLM):
+        return error
+    if isinstance(error, KeyError):
+        return ErrorConfiguracionLLM(f"Error de configuración para {suborgano}: no se encontró la clave {error} en config.ini", suborgano, modelo)
+    if isinstance(error, asyncio.TimeoutError):
+        return ErrorTransitorioLLM(f"Tiempo de espera agotado al llamar a {modelo} para {suborgano}", suborgano, modelo)
+    codigo = getattr(error, "code", None)
+    if isinstance(codigo, int):
+        if codigo in CODIGOS_CUOTA:
+            return ErrorCuotaLLM(f"Cuota agotada en {modelo} para {suborgano}: {error}", suborgano, modelo)
+        if codigo in CODIGOS_TRANSITORIOS:
+            return ErrorTransitorioLLM(f"Error transitorio de {modelo} para {suborgano}: {error}", suborgano, modelo)
+    if isinstance(error, (ConnectionError, http.client.HTTPException, TimeoutError)):
+        return ErrorTransitorioLLM(f"Error de conexión con {modelo} para {suborgano}: {error}", suborgano, modelo)
+    return ErrorLLM(f"Error al llamar al LLM ({modelo}) para {suborgano}: {error}", suborgano, modelo)
+
+
+class CuboTokens:
+    """
+    Limitador de cuota por minuto (token bucket) sin hilo propio: reservar()
+    descuenta la solicitud y devuelve cuántos segundos hay que esperar para
+    no superar el ritmo. Sirve tanto a llamadas síncronas (time.sleep) como
+    asíncronas (asyncio.sleep). Un límite de 0 desactiva esa dimensión.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._ultimo = time.monotonic()
+        self._solicitudes = rpm  # Capacidad disponible; arranca llena
+        self._tokens = tpm
+
+    def ajustar(self, rpm: float, tpm: float):
+        """
+        Cambia los límites conservando lo ya consumido de la cuota. Una
+        dimensión que estaba desactivada (límite 0) arranca llena, como en
+        un cubo nuevo.
+        """
+        with self._lock:
+            self._recargar(time.monotonic())
+            self._solicitudes = rpm if self.rpm <= 0 else min(self._solicitudes, rpm)
+            self._tokens = tpm if self.tpm <= 0 else min(self._tokens, tpm)
+            self.rpm = rpm
+            self.tpm = tpm
+
+    def _recargar(self, ahora: float):
+        transcurrido = ahora - self._ultimo
+        self._ultimo = ahora
+        if self.rpm > 0:
+            self._solicitudes = min(self.rpm, self._solicitudes + transcurrido * self.rpm / 60.0)
+        if self.tpm > 0:
+            self._tokens = min(self.tpm, self._tokens + transcurrido * self.tpm / 60.0)
+
+    def reservar(self, tokens: int) -> float:
+        """Reserva una solicitud de tokens estimados; devuelve la espera necesaria en segundos."""
+        with self._lock:
+            self._recargar(time.monotonic())
+            espera = 0.0
+            if self.rpm > 0:
+                self._solicitudes -= 1
+                if self._solicitudes < 0:
+                    espera = max(espera, -self._solicitudes * 60.0 / self.rpm)
+            if self.tpm > 0:
+                # Una solicitud mayor que la cuota entera pasaría igual, tras vaciarla
+                self._tokens -= min(tokens, self.tpm)
+                if self._tokens < 0:
+                    espera = max(espera, -self._tokens * 60.0 / self.tpm)
+            return espera
+
+    def vaciar(self):
+        """Tras un 429 del proveedor: la próxima solicitud espera un intervalo completo de la cuota."""
+        with self._lock:
+            self._recargar(time.monotonic())
+            if self.rpm > 0:
+                self._solicitudes = min(self._solicitudes, 0.0)
+
+
+class Disyuntor:
+    """
+    Circuit breaker por modelo. Tras umbral llamadas fallidas seguidas (con
+    sus reintentos agotados) se abre durante pausa segundos (duplicándose en
+    cada apertura consecutiva, hasta pausa_maxima); luego deja pasar una
+    llamada de prueba y se cierra si sale bien.
+    """
+
+    def __init__(self, umbral: int, pausa: float, pausa_maxima: float):
+        self.umbral = umbral
+        self.pausa = pausa
+        self.pausa_maxima = pausa_maxima
+        self._lock = threading.Lock()
+        self._fallos = 0
+        self._aperturas = 0
+        self._abierto_hasta = 0.0
+        self._prueba_desde = None  # Inicio de la llamada de prueba en curso (semiabierto)
+
+    @property
+    def abierto(self) -> bool:
+        return time.monotonic() < self._abierto_hasta
+
+    @property
+    def semiabierto(self) -> bool:
+        """Pasó la pausa tras una apertura y aún no hubo un éxito: las llamadas son de prueba."""
+        return self.umbral > 0 and self._aperturas > 0 and self._fallos >= self.umbral and not self.abierto
+
+    def permitir(self) -> float:
+        """0 si la llamada puede pasar; si no, segundos hasta que el circuito admita una prueba."""
+        if self.umbral <= 0:
+            return 0.0
+        with self._lock:
+            restante = self._abierto_hasta - time.monotonic()
+            if restante > 0:
+                return restante
+            if self._aperturas and self._fallos >= self.umbral:
+                # Semiabierto: una sola llamada de prueba a la vez. Si la prueba
+                # no informa resultado (p. ej. fue cancelada) se admite otra tras una pausa.
+                ahora = time.monotonic()
+                if self._prueba_desde is not None and ahora - self._prueba_desde < self.pausa:
+                    return self.pausa - (ahora - self._prueba_desde)
+                self._prueba_desde = ahora
+            return 0.0
+
+    def registrar_exito(self):
+        with self._lock:
+            self._fallos = 0
+            self._aperturas = 0
+            self._prueba_desde = None
+
+    def registrar_fallo(self) -> float:
+        """Cuenta un fallo; si con él se abre el circuito devuelve los segundos de apertura, si no 0."""
+        if self.umbral <= 0:
+            return 0.0
+        with self._lock:
+            self._fallos += 1
+            self._prueba_desde = None
+            if self._fallos < self.umbral:
+                return 0.0
+            pausa = min(self.pausa_maxima, self.pausa * 2 ** self._aperturas)
+            self._aperturas += 1
+            self._abierto_hasta = time.monotonic() + pausa
+            return pausa
+
+
+class ControlModelo:
+    """Cuota, política de reintentos y disyuntor de un modelo (sección LIMITES de config.ini)."""
+
+    def __init__(self, modelo: str, config):
+        self.modelo = modelo
+        self.cubo = CuboTokens(0.0, 0.0)
+        self.disyuntor = Disyuntor(0, 0.0, 0.0)
+        self.actualizar(config)
+
+    def actualizar(self, config):
+        """
+        Aplica los límites de config.ini. Al recargar la configuración se
+        llama sobre el control existente, de modo que la cuota consumida y el
+        estado del disyuntor sobreviven a la recarga.
+        """
+        def ajuste(clave, por_defecto):
+            # Un valor por modelo (p. ej. RPM_gemini-1.5-pro-latest) tiene prioridad sobre el general
+            return config.getfloat('LIMITES', f'{clave}_{self.modelo}', fallback=config.getfloat('LIMITES', clave, fallback=por_defecto))
+
+        self.cubo.ajustar(ajuste('RPM', 0.0), ajuste('TPM', 0.0))
+        self.reintentos = int(ajuste('REINTENTOS', 4))
+        self.espera_base = ajuste('ESPERA_BASE', 1.0)
+        self.espera_maxima = ajuste('ESPERA_MAXIMA', 30.0)
+        self.disyuntor.umbral = int(ajuste('UMBRAL_CIRCUITO', 5))
+        self.disyuntor.pausa = ajuste('PAUSA_CIRCUITO', 30.0)
+        self.disyuntor.pausa_maxima = ajuste('PAUSA_MAXIMA_CIRCUITO', 300.0)
+
+    def antes_de_llamar(self, suborgano: str, tokens: int) -> float:
+        """Lanza CircuitoAbierto si el modelo no está sano; si no, reserva cuota y devuelve la espera."""
+        restante = self.disyuntor.permitir()
+        if restante > 0:
+            raise CircuitoAbierto(
+                f"Circuito abierto para {self.modelo}: sin llamadas durante {restante:.1f}s", suborgano, self.modelo, restante
+            )
+        return self.cubo.reservar(tokens)
+
+    def tras_fallo(self, error: Exception, suborgano: str, intento: int) -> tuple:
+        """
+        Clasifica el fallo del intento (0, 1, ...). Devuelve (ErrorLLM, espera):
+        espera es el backoff exponencial con jitter completo antes del próximo
+        intento, o None si no hay que reintentar. El disyuntor cuenta un fallo
+        por llamada, cuando se agotan sus reintentos, no uno por intento; la
+        llamada de prueba del circuito semiabierto no se reintenta.
+        """
+        error_llm = clasificar_error(error, suborgano, self.modelo)
+        if not error_llm.reintentable:
+            return error_llm, None
+        if isinstance(error_llm, ErrorCuotaLLM):
+            self.cubo.vaciar()
+        if intento < self.reintentos and not self.disyuntor.semiabierto:
+            return error_llm, random.uniform(0, min(self.espera_maxima, self.espera_base * 2 ** intento))
+        pausa = self.disyuntor.registrar_fallo()
+        if pausa:
+            return CircuitoAbierto(
+                f"Circuito abierto para {self.modelo} durante {pausa:.0f}s tras fallos consecutivos (último: {error_llm})",
+                suborgano, self.modelo, pausa
+            ), None
+        return error_llm, None
+
+    def tras_exito(self):
+        self.disyuntor.registrar_exito()
@@ -0,0 +1,303 @@
+# src/servidor.py
+#
+# Modo servidor sin interfaz: aloja muchas sesiones de NeoC aisladas en un
+# solo proceso y las expone por HTTP local. Todas las sesiones comparten el
+# motor asíncrono (event loop, semáforos por modelo) y el backend de LLM
+# (RegistroModelos); cada una tiene su propia memoria y sus logs en
+# database/sesiones/<id> y logs/sesiones/<id>.
+#
+# API (JSON; la salida de cada sesión se recibe por Server-Sent Events):
+#     GET    /salud
+#     GET    /metrics                       métricas de todas las sesiones (formato de texto de Prometheus)
+#     GET    /sesiones
+#     POST   /sesiones                      {"id": opcional}
+#     DELETE /sesiones/<id>
+#     POST   /sesiones/<id>/mensajes        {"texto": "..."}
+#     POST   /sesiones/<id>/comandos        {"command": "toggle_pause"} | {"command": "set_logging", "config": {...}}
+#     GET    /sesiones/<id>/eventos         text/event-stream (acepta Last-Event-ID o ?desde=N)
+# Uso:
+#     python -m src.servidor --puerto 8080
+
+import argparse
+import collections
+import configparser
+import json
+import os
+import queue
+import re
+import threading
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.agent import Agencont
+from src.llm_handler import CONFIG_PATH
+from src.metricas import responder_metricas
+from src.motor_llm import MotorLLM
+
+ID_VALIDO = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+# Intervalo (s) de los comentarios keep-alive en los streams de eventos
+INTERVALO_KEEPALIVE = 15
+
+
+class BufferEventos:
+    """
+    Cola de salida de una sesión. El agente solo llama a put(); cada mensaje
+    recibe un número de secuencia y se conserva en un anillo de tamaño fijo,
+    de modo que varios clientes pueden leerlo y reconectarse sin perder lo
+    reciente, y una sesión sin clientes no acumula memoria sin límite.
+    """
+
+    def __init__(self, max_eventos: int = 1000):
+        self._eventos = collections.deque(maxlen=max_eventos)
+        self._siguiente = 1
+        self._condicion = threading.Condition()
+
+    def put(self, item, block=True, timeout=None):
+        with self._condicion:
+            self._eventos.append((self._siguiente, item))
+            self._siguiente += 1
+            self._condicion.notify_all()
+
+    def desde(self, ultimo: int, timeout: float = None) -> list:
+        """Eventos con secuencia mayor que ultimo; espera hasta timeout si todavía no hay ninguno."""
+        with self._condicion:
+            self._condicion.wait_for(lambda: self._siguiente - 1 > ultimo, timeout)
+            return [(seq, item) for seq, item in self._eventos if seq > ultimo]
+
+
+class Sesion:
+    """Un Agencont con su bucle autónomo en un hilo propio, su bandeja de entrada y su buffer de eventos."""
+
+    def __init__(self, id_sesion: str, motor: MotorLLM, config):
+        self.id = id_sesion
+        self.entrada = queue.Queue()
+        self.eventos = BufferEventos(config.getint('SERVIDOR', 'EVENTOS_POR_SESION', fallback=1000))
+        self.agente = Agencont(
+            input_queue=self.entrada, output_queue=self.eventos, motor=motor, espacio=id_sesion,
+            dir_logs=os.path.join('logs', 'sesiones'), dir_datos=os.path.join('database', 'sesiones')
+        )
+        if config.getboolean('SERVIDOR', 'INICIAR_EN_PAUSA', fallback=False):
+            self.entrada.put(json.dumps({"command": "toggle_pause"}))
+        self.hilo = threading.Thread(target=self.agente.iniciar_bucle_autonomo, name=f"NeoC_Sesion_{id_sesion}", daemon=True)
+        self.hilo.start()
+
+    def estado(self) -> dict:
+        return {
+            "id": self.id,
+            "ciclo": self.agente.ciclo,
+            "turno": self.agente.turno,
+            "pausado": self.agente.is_paused,
+            "activa": self.hilo.is_alive(),
+        }
+
+    def cerrar(self, timeout: float = 30):
+        # "apagar" interrumpe la llamada en curso y hace que el agente cierre su memoria y sus logs
+        self.entrada.put("apagar")
+        self.hilo.join(timeout)
+
+
+class GestorSesiones:
+    """Crea, busca y cierra sesiones sobre un único MotorLLM compartido."""
+
+    def __init__(self, config):
+        self.config = config
+        self.max_sesiones = config.getint('SERVIDOR', 'MAX_SESIONES', fallback=50)
+        self.motor = MotorLLM()
+        self._sesiones = {}
+        self._lock = threading.Lock()
+
+    def crear(self, id_sesion: str = None) -> Sesion:
+        id_sesion = id_sesion or uuid.uuid4().hex[:12]
+        if not ID_VALIDO.match(id_sesion):
+            raise ValueError(f"Id de sesión inválido: '{id_sesion}' (letras, dígitos, '-' o '_', hasta 64)")
+        with self._lock:
+            if id_sesion in self._sesiones:
+                raise KeyError(f"La sesión '{id_sesion}' ya existe")
+            if len(self._sesiones) >= self.max_sesiones:
+                raise OverflowError(f"Se alcanzó el máximo de {self.max_sesiones} sesiones")
+            sesion = Sesion(id_sesion, self.motor, self.config)
+            self._sesiones[id_sesion] = sesion
+            return sesion
+
+    def obtener(self, id_sesion: str) -> Sesion:
+        with self._lock:
+            return self._sesiones.get(id_sesion)
+
+    def listar(self) -> list:
+        with self._lock:
+            sesiones = list(self._sesiones.values())
+        return [sesion.estado() for sesion in sesiones]
+
+    def cerrar(self, id_sesion: str) -> bool:
+        with self._lock:
+            sesion = self._sesiones.pop(id_sesion, None)
+        if sesion is None:
+            return False
+        sesion.cerrar()
+        return True
+
+    def cerrar_todas(self):
+        with self._lock:
+            sesiones, self._sesiones = list(self._sesiones.values()), {}
+        for sesion in sesiones:
+            sesion.entrada.put("apagar")
+        for sesion in sesiones:
+            sesion.hilo.join(30)
+        self.motor.detener()
+
+
+class _ManejadorSesiones(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    gestor = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, estado: int, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode('utf-8')
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _leer_json(self) -> dict:
+        largo = int(self.headers.get("Content-Length", 0))
+        datos = json.loads(self.rfile.read(largo) or b"{}")
+        if not isinstance(datos, dict):
+            raise ValueError("El cuerpo debe ser un objeto JSON")
+        return datos
+
+    def _ruta(self) -> tuple:
+        url = urllib.parse.urlparse(self.path)
+        partes = [p for p in url.path.split("/") if p]
+        return partes, urllib.parse.parse_qs(url.query)
+
+    def _sesion(self, id_sesion: str):
+        sesion = self.gestor.obtener(id_sesion)
+        if sesion is None:
+            self._responder(404, {"error": f"No existe la sesión '{id_sesion}'"})
+        return sesion
+
+    def do_GET(self):
+        partes, consulta = self._ruta()
+        if partes == ["salud"]:
+            self._responder(200, {"estado": "ok", "sesiones": len(self.gestor.listar())})
+        elif partes == ["metrics"]:
+            responder_metricas(self)
+        elif partes == ["sesiones"]:
+            self._responder(200, {"sesiones": self.gestor.listar()})
+        elif len(partes) == 3 and partes[0] == "sesiones" and partes[2] == "eventos":
+            sesion = self._sesion(partes[1])
+            if sesion:
+                ultimo = self.headers.get("Last-Event-ID") or consulta.get("desde", ["0"])[0]
+                try:
+                    desde = int(ultimo)
+                except ValueError:
+                    desde = -1
+                if desde < 0:
+                    self._responder(400, {"error": f"Last-Event-ID o 'desde' inválido: '{ultimo}'"})
+                    return
+                self._transmitir_eventos(sesion, desde)
+        else:
+            self._responder(404, {"error": "Ruta desconocida"})
+
+    def do_POST(self):
+        partes, _ = self._ruta()
+        try:
+            datos = self._leer_json()
+        except ValueError as e:
+            self._responder(400, {"error": f"JSON inválido: {e}"})
+            return
+
+        if partes == ["sesiones"]:
+            try:
+                sesion = self.gestor.crear(datos.get("id"))
+            except ValueError as e:
+                self._responder(400, {"error": str(e)})
+            except KeyError as e:
+                self._responder(409, {"error": e.args[0]})
+            except OverflowError as e:
+                self._responder(503, {"error": str(e)})
+            else:
+                self._responder(201, sesion.estado())
+        elif len(partes) == 3 and partes[0] == "sesiones" and partes[2] in ("mensajes", "comandos"):
+            sesion = self._sesion(partes[1])
+            if not sesion:
+                return
+            if partes[2] == "mensajes":
+                texto = datos.get("texto")
+                if not isinstance(texto, str) or not texto.strip():
+                    self._responder(400, {"error": "Falta el campo 'texto'"})
+                    return
+                sesion.entrada.put(texto)
+            else:
+                if "command" not in datos:
+                    self._responder(400, {"error": "Falta el campo 'command'"})
+                    return
+                sesion.entrada.put(json.dumps(datos))
+            self._responder(202, {"id": sesion.id})
+        else:
+            self._responder(404, {"error": "Ruta desconocida"})
+
+    def do_DELETE(self):
+        partes, _ = self._ruta()
+        if len(partes) == 2 and partes[0] == "sesiones":
+            if self.gestor.cerrar(partes[1]):
+                self._responder(200, {"id": partes[1], "cerrada": True})
+            else:
+                self._responder(404, {"error": f"No existe la sesión '{partes[1]}'"})
+        else:
+            self._responder(404, {"error": "Ruta desconocida"})
+
+    def _transmitir_eventos(self, sesion: Sesion, ultimo: int):
+        """Envía los mensajes de salida de la sesión como Server-Sent Events hasta que el cliente se desconecte o la sesión termine."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                eventos = sesion.eventos.desde(ultimo, INTERVALO_KEEPALIVE)
+                if not eventos:
+                    if not sesion.hilo.is_alive():
+                        return
+                    self.wfile.write(b": keep-alive\n\n")
+                for seq, item in eventos:
+                    tipo = item.get("type", "mensaje") if isinstance(item, dict) else "mensaje"
+                    datos = json.dumps(item, ensure_ascii=False)
+                    self.wfile.write(f"id: {seq}\nevent: {tipo}\ndata: {datos}\n\n".encode('utf-8'))
+                    ultimo = seq
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def servir(gestor: GestorSesiones, host: str = "127.0.0.1", puerto: int = 8080) -> ThreadingHTTPServer:
+    """Crea el servidor HTTP (sin arrancarlo); llamar a serve_forever() sobre el resultado."""
+    manejador = type("ManejadorSesiones", (_ManejadorSesiones,), {"gestor": gestor})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    servidor.daemon_threads = True
+    return servidor
+
+
+if __name__ == '__main__':
+    config = configparser.ConfigParser()
+    config.read(CONFIG_PATH)
+    parser = argparse.ArgumentParser(description="Servidor NeoC sin interfaz con sesiones aisladas")
+    parser.add_argument("--host", default=config.get('SERVIDOR', 'HOST', fallback='127.0.0.1'))
+    parser.add_argument("--puerto", type=int, default=config.getint('SERVIDOR', 'PUERTO', fallback=8080))
+    args = parser.parse_args()
+
+    gestor = GestorSesiones(config)
+    servidor = servir(gestor, args.host, args.puerto)
+    print(f"Servidor NeoC escuchando en http://{args.host}:{args.puerto} (máximo {gestor.max_sesiones} sesiones)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        gestor.cerrar_todas()
@@ -0,0 +1,18 @@
+# tests/test_benchmark.py
+
+from src.benchmark import percentiles
+
+
+def test_percentiles_por_rango_mas_cercano():
+    veinte = percentiles(list(range(1, 21)))
+    assert (veinte["p50"], veinte["p95"], veinte["p99"]) == (10, 19, 20)
+    cien = percentiles(list(range(1, 101)))
+    assert (cien["p50"], cien["p95"], cien["p99"]) == (50, 95, 99)
+
+
+def test_percentiles_muestras_pequenas():
+    assert percentiles([]) == {"n": 0}
+    uno = percentiles([7.0])
+    assert uno["p50"] == uno["p99"] == uno["min"] == uno["max"] == 7.0
+    dos = percentiles([2.0, 1.0])
+    assert (dos["p50"], dos["p95"], dos["media"]) == (1.0, 2.0, 1.5)
@@ -0,0 +1,50 @@
+# tests/test_contenidos_parciales.py
+
+import json
+from src.agent import _contenidos_parciales
+
+
+def test_contenido_completo_coincide_con_json_loads():
+    texto = json.dumps({"accion": "RESPONDER", "contenido": 'línea 1\nlínea "2" \\ fin 😀'})
+    assert _contenidos_parciales(texto) == [json.loads(texto)["contenido"]]
+
+
+def test_varias_acciones_en_orden():
+    texto = '{"acciones": [{"accion": "A", "contenido": "uno"}, {"accion": "B", "contenido": "do'
+    assert _contenidos_parciales(texto) == ["uno", "do"]
+
+
+def test_escape_cortado_se_omite_hasta_completarse():
+    assert _contenidos_parciales('{"contenido": "a\\') == ["a"]
+    assert _contenidos_parciales('{"contenido": "a\\u00') == ["a"]
+    assert _contenidos_parciales('{"contenido": "a\\u00e1') == ["aá"]
+
+
+def test_par_surrogate_se_une_en_un_caracter():
+    texto = '{"contenido": "hola \\ud83d\\ude00!"}'
+    assert _contenidos_parciales(texto) == ["hola 😀!"] == [json.loads(texto)["contenido"]]
+
+
+def test_surrogate_alto_espera_al_bajo():
+    completo = '{"contenido": "x\\ud83d\\ude00"}'
+    prefijo = '{"contenido": "x\\ud83d'
+    for fin in range(len(prefijo), len(completo) - 2):
+        parcial = _contenidos_parciales(completo[:fin])[0]
+        assert parcial == "x", completo[:fin]
+        parcial.encode('utf-8')  # Sin surrogates sueltos
+    assert _contenidos_parciales(completo[:-2]) == ["x😀"]
+
+
+def test_cada_prefijo_es_prefijo_del_resultado_final():
+    texto = json.dumps({"contenido": "ñandú 🐦‍🔥 \"fin\"\t"}, ensure_ascii=True)
+    final = json.loads(texto)["contenido"]
+    for fin in range(len(texto) + 1):
+        parciales = _contenidos_parciales(texto[:fin])
+        if parciales:
+            assert final.startswith(parciales[0])
+            parciales[0].encode('utf-8')
+
+
+def test_surrogate_alto_sin_pareja_como_json_loads():
+    texto = '{"contenido": "a\\ud83db"}'
+    assert _contenidos_parciales(texto) == [json.loads(texto)["contenido"]]
@@ -0,0 +1,61 @@
+# tests/test_contexto.py
+
+import concurrent.futures
+from src.contexto import GestorContexto, estimar_tokens
+
+
+def _futuro(resultado=None, error=None) -> concurrent.futures.Future:
+    futuro = concurrent.futures.Future()
+    if error is not None:
+        futuro.set_exception(error)
+    else:
+        futuro.set_result(resultado)
+    return futuro
+
+
+def test_ventana_respeta_el_presupuesto_de_cada_suborgano():
+    gestor = GestorContexto({"EGOS": 30, "SUBCON": 10})
+    for i in range(10):
+        gestor.agregar(f"turno {i} " + "x" * 30)  # ≈10 tokens cada uno
+    egos = gestor.contexto("EGOS").split("\n")
+    subcon = gestor.contexto("SUBCON").split("\n")
+    assert len(egos) == 3 and egos[-1].startswith("turno 9")
+    assert len(subcon) == 1 and subcon[0].startswith("turno 9")
+    assert len(gestor) == 10  # Sin resumir, la ventana no descarta turnos
+
+
+def test_resumen_absorbe_los_turnos_antiguos():
+    prompts = []
+
+    def resumir(prompt):
+        prompts.append(prompt)
+        return _futuro('{"contenido": "resumen breve"}')
+
+    gestor = GestorContexto({"EGOS": 20}, resumir=resumir, lote_resumen=10)
+    for i in range(4):
+        gestor.agregar(f"turno {i} " + "x" * 30)
+    assert prompts and "turno 0" in prompts[0]
+    contexto = gestor.contexto("EGOS")
+    assert contexto.startswith("[Resumen de la conversación anterior] resumen breve")
+    assert "turno 0" not in contexto
+    assert gestor.primer_turno > 0
+    assert gestor.primer_turno + len(gestor) == 4
+
+
+def test_fallo_del_resumen_conserva_los_turnos():
+    gestor = GestorContexto({"EGOS": 20}, resumir=lambda prompt: _futuro(error=RuntimeError("sin modelo")), lote_resumen=10)
+    for i in range(4):
+        gestor.agregar(f"turno {i} " + "x" * 30)
+    gestor.contexto("EGOS")
+    assert gestor.resumen == ""
+    assert len(gestor) == 4 and gestor.primer_turno == 0
+
+
+def test_restaurar_no_pide_resumen():
+    llamadas = []
+    gestor = GestorContexto({"EGOS": 20}, resumir=lambda prompt: llamadas.append(prompt) or _futuro("{}"), lote_resumen=1)
+    gestor.restaurar(["a" * 100, "b" * 100], "resumen previo", primer_turno=7)
+    assert llamadas == []
+    assert gestor.primer_turno == 7
+    assert gestor.turnos[0] == ("a" * 100, estimar_tokens("a" * 100))
+    assert gestor.contexto("EGOS").startswith("[Resumen de la conversación anterior] resumen previo")
@@ -0,0 +1,44 @@
+# tests/test_estado.py
+
+from src.estado import EstadoAgente
+
+
+def test_punto_de_control_se_recupera_al_reabrir(tmp_path):
+    ruta = str(tmp_path / "estado.db")
+    estado = EstadoAgente(ruta)
+    assert estado.cargar() is None
+    assert estado.guardar({"ciclo": 3, "pensamiento_actual": "¿qué es NeoC?"}, ["t0", "t1"], 0)
+    estado.cerrar()
+
+    estado = EstadoAgente(ruta)
+    valores, turnos, primer_turno = estado.cargar()
+    estado.cerrar()
+    assert valores == {"ciclo": 3, "pensamiento_actual": "¿qué es NeoC?"}
+    assert turnos == ["t0", "t1"] and primer_turno == 0
+
+
+def test_guardar_es_incremental(tmp_path):
+    ruta = str(tmp_path / "estado.db")
+    estado = EstadoAgente(ruta)
+    estado.guardar({"ciclo": 1}, ["t0", "t1"], 0)
+    assert not estado.guardar({"ciclo": 1}, ["t0", "t1"], 0)
+    # El resumen absorbió t0 y llegó t2
+    assert estado.guardar({"ciclo": 2}, ["t1", "t2"], 1)
+    estado.cerrar()
+
+    estado = EstadoAgente(ruta)
+    valores, turnos, primer_turno = estado.cargar()
+    estado.cerrar()
+    assert valores == {"ciclo": 2}
+    assert turnos == ["t1", "t2"] and primer_turno == 1
+
+
+def test_sin_reanudar_descarta_el_estado(tmp_path):
+    ruta = str(tmp_path / "estado.db")
+    estado = EstadoAgente(ruta)
+    estado.guardar({"ciclo": 5}, ["t0"], 0)
+    estado.cerrar()
+
+    estado = EstadoAgente(ruta, reanudar=False)
+    assert estado.cargar() is None
+    estado.cerrar()
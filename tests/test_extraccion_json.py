@@ -0,0 +1,60 @@
+# tests/test_extraccion_json.py
+
+from src.extraccion_json import extraer_json
+
+
+def test_objeto_simple():
+    resultado = extraer_json('{"accion": "PENSAR", "contenido": "hola"}')
+    assert resultado.ok
+    assert resultado.datos == {"accion": "PENSAR", "contenido": "hola"}
+    assert resultado.error is None
+
+
+def test_objeto_rodeado_de_texto_y_bloque_markdown():
+    texto = 'Claro, aquí va:\n```json\n{"accion": "NUEVA_IDEA", "contenido": "x"}\n```\nEspero que sirva.'
+    resultado = extraer_json(texto)
+    assert resultado.datos == {"accion": "NUEVA_IDEA", "contenido": "x"}
+    assert resultado.texto == '{"accion": "NUEVA_IDEA", "contenido": "x"}'
+
+
+def test_llaves_y_comillas_dentro_de_cadenas():
+    texto = '{"contenido": "una llave } y otra { y una comilla \\" escapada"}'
+    resultado = extraer_json(texto)
+    assert resultado.datos == {"contenido": 'una llave } y otra { y una comilla " escapada'}
+
+
+def test_objetos_anidados():
+    texto = '{"acciones": [{"accion": "A", "contenido": "1"}, {"accion": "B", "contenido": "2"}]}'
+    resultado = extraer_json(texto)
+    assert [a["accion"] for a in resultado.datos["acciones"]] == ["A", "B"]
+
+
+def test_candidato_invalido_sigue_con_el_siguiente():
+    texto = '{no es json} y luego {"contenido": "válido"}'
+    resultado = extraer_json(texto)
+    assert resultado.datos == {"contenido": "válido"}
+
+
+def test_respuesta_vacia():
+    for texto in ("", None):
+        resultado = extraer_json(texto)
+        assert not resultado.ok
+        assert resultado.error == "respuesta vacía"
+
+
+def test_sin_objeto():
+    resultado = extraer_json("solo texto, sin llaves")
+    assert not resultado.ok
+    assert "no hay ningún objeto JSON" in resultado.error
+
+
+def test_objeto_truncado():
+    resultado = extraer_json('{"accion": "PENSAR", "contenido": "a medio')
+    assert not resultado.ok
+    assert "incompleto" in resultado.error
+
+
+def test_json_invalido_informa_la_posicion():
+    resultado = extraer_json('texto {"a": 1,}')
+    assert not resultado.ok
+    assert "JSON inválido en la posición" in resultado.error
@@ -0,0 +1,203 @@
+# tests/test_resiliencia.py
+
+import configparser
+import pytest
+from src import resiliencia
+from src.resiliencia import (
+    CircuitoAbierto, ControlModelo, CuboTokens, Disyuntor, ErrorConfiguracionLLM, ErrorCuotaLLM,
+    ErrorTransitorioLLM, clasificar_error
+)
+
+
+class Reloj:
+    """Sustituye a time.monotonic en src.resiliencia para controlar el paso del tiempo."""
+
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, segundos: float):
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(resiliencia.time, "monotonic", reloj)
+    return reloj
+
+
+def _control(**limites) -> ControlModelo:
+    config = configparser.ConfigParser()
+    config.read_dict({"LIMITES": {"ESPERA_BASE": "0", **{clave: str(valor) for clave, valor in limites.items()}}})
+    return ControlModelo("modelo", config)
+
+
+# --- Disyuntor ---
+
+def test_disyuntor_se_abre_al_alcanzar_el_umbral(reloj):
+    disyuntor = Disyuntor(umbral=3, pausa=10, pausa_maxima=100)
+    assert disyuntor.registrar_fallo() == 0
+    assert disyuntor.registrar_fallo() == 0
+    assert disyuntor.permitir() == 0
+    assert disyuntor.registrar_fallo() == 10
+    assert disyuntor.abierto
+    assert disyuntor.permitir() == pytest.approx(10)
+
+
+def test_disyuntor_exito_reinicia_el_conteo(reloj):
+    disyuntor = Disyuntor(umbral=2, pausa=10, pausa_maxima=100)
+    disyuntor.registrar_fallo()
+    disyuntor.registrar_exito()
+    assert disyuntor.registrar_fallo() == 0
+    assert not disyuntor.abierto
+
+
+def test_disyuntor_semiabierto_admite_una_sola_prueba(reloj):
+    disyuntor = Disyuntor(umbral=1, pausa=10, pausa_maxima=100)
+    disyuntor.registrar_fallo()
+    reloj.avanzar(10)
+    assert disyuntor.semiabierto
+    assert disyuntor.permitir() == 0  # La llamada de prueba
+    assert disyuntor.permitir() > 0   # Otra mientras la prueba sigue en curso
+    disyuntor.registrar_exito()
+    assert not disyuntor.semiabierto
+    assert disyuntor.permitir() == 0
+
+
+def test_disyuntor_duplica_la_pausa_hasta_el_maximo(reloj):
+    disyuntor = Disyuntor(umbral=1, pausa=10, pausa_maxima=25)
+    pausas = []
+    for _ in range(3):
+        pausas.append(disyuntor.registrar_fallo())
+        reloj.avanzar(pausas[-1])
+    assert pausas == [10, 20, 25]
+
+
+def test_disyuntor_desactivado_con_umbral_cero(reloj):
+    disyuntor = Disyuntor(umbral=0, pausa=10, pausa_maxima=100)
+    for _ in range(10):
+        assert disyuntor.registrar_fallo() == 0
+    assert disyuntor.permitir() == 0
+
+
+# --- ControlModelo ---
+
+def test_reintentos_no_cuentan_como_fallos_del_disyuntor(reloj):
+    control = _control(REINTENTOS=3, UMBRAL_CIRCUITO=2)
+    error = ErrorTransitorioLLM("503")
+    for intento in range(3):
+        _, espera = control.tras_fallo(error, "CONS", intento)
+        assert espera is not None
+    assert not control.disyuntor.abierto
+    # Agotados los reintentos, la llamada cuenta como un único fallo
+    error_final, espera = control.tras_fallo(error, "CONS", 3)
+    assert espera is None and error_final is error
+    assert not control.disyuntor.abierto
+
+
+def test_llamadas_fallidas_seguidas_abren_el_circuito(reloj):
+    control = _control(REINTENTOS=1, UMBRAL_CIRCUITO=2, PAUSA_CIRCUITO=30)
+    error = ErrorTransitorioLLM("503")
+    control.tras_fallo(error, "CONS", 1)
+    error_final, espera = control.tras_fallo(error, "CONS", 1)
+    assert isinstance(error_final, CircuitoAbierto) and espera is None
+    assert error_final.reintentar_en == 30
+    with pytest.raises(CircuitoAbierto):
+        control.antes_de_llamar("CONS", 10)
+
+
+def test_prueba_del_circuito_semiabierto_no_se_reintenta(reloj):
+    control = _control(REINTENTOS=4, UMBRAL_CIRCUITO=1, PAUSA_CIRCUITO=5)
+    control.tras_fallo(ErrorTransitorioLLM("503"), "CONS", 4)
+    reloj.avanzar(5)
+    control.antes_de_llamar("CONS", 10)
+    error_final, espera = control.tras_fallo(ErrorTransitorioLLM("503"), "CONS", 0)
+    assert isinstance(error_final, CircuitoAbierto) and espera is None
+
+
+def test_errores_no_reintentables_no_tocan_el_disyuntor(reloj):
+    control = _control(UMBRAL_CIRCUITO=1)
+    error_final, espera = control.tras_fallo(KeyError("CONS_MODEL"), "CONS", 0)
+    assert isinstance(error_final, ErrorConfiguracionLLM) and espera is None
+    assert not control.disyuntor.abierto
+
+
+def test_actualizar_conserva_el_estado_del_disyuntor(reloj):
+    control = _control(REINTENTOS=0, UMBRAL_CIRCUITO=1)
+    disyuntor = control.disyuntor
+    control.tras_fallo(ErrorTransitorioLLM("503"), "CONS", 0)
+    config = configparser.ConfigParser()
+    config.read_dict({"LIMITES": {"UMBRAL_CIRCUITO": "3", "RPM": "60"}})
+    control.actualizar(config)
+    assert control.disyuntor is disyuntor and disyuntor.abierto
+    assert disyuntor.umbral == 3 and control.cubo.rpm == 60
+
+
+# --- CuboTokens ---
+
+def test_cubo_espera_al_agotar_las_solicitudes(reloj):
+    cubo = CuboTokens(rpm=2, tpm=0)
+    assert cubo.reservar(100) == 0
+    assert cubo.reservar(100) == 0
+    assert cubo.reservar(100) == pytest.approx(30)
+    reloj.avanzar(60)
+    assert cubo.reservar(100) == 0
+
+
+def test_cubo_limita_tokens_por_minuto(reloj):
+    cubo = CuboTokens(rpm=0, tpm=1000)
+    assert cubo.reservar(800) == 0
+    assert cubo.reservar(400) == pytest.approx(12)
+
+
+def test_cubo_vaciar_tras_un_429(reloj):
+    cubo = CuboTokens(rpm=6, tpm=0)
+    cubo.vaciar()
+    assert cubo.reservar(1) == pytest.approx(10)
+
+
+def test_control_nuevo_arranca_con_el_cubo_lleno(reloj):
+    control = _control(RPM=15)
+    assert [control.antes_de_llamar("CONS", 100) for _ in range(15)] == [0] * 15
+    assert control.antes_de_llamar("CONS", 100) == pytest.approx(4)
+
+
+def test_limite_activado_en_caliente_arranca_lleno(reloj):
+    cubo = CuboTokens(rpm=0, tpm=0)
+    cubo.ajustar(rpm=3, tpm=0)
+    assert [cubo.reservar(1) for _ in range(3)] == [0] * 3
+
+
+def test_reducir_el_limite_conserva_lo_consumido(reloj):
+    cubo = CuboTokens(rpm=10, tpm=0)
+    for _ in range(8):
+        cubo.reservar(1)
+    cubo.ajustar(rpm=5, tpm=0)
+    assert [cubo.reservar(1) for _ in range(2)] == [0, 0]
+    assert cubo.reservar(1) == pytest.approx(12)
+
+
+# --- clasificar_error ---
+
+class _ErrorHTTP(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+@pytest.mark.parametrize("error, tipo", [
+    (_ErrorHTTP(429), ErrorCuotaLLM),
+    (_ErrorHTTP(503), ErrorTransitorioLLM),
+    (ConnectionResetError(), ErrorTransitorioLLM),
+    (KeyError("EGOS_MODEL"), ErrorConfiguracionLLM),
+])
+def test_clasificar_error(error, tipo):
+    assert type(clasificar_error(error, "EGOS", "modelo")) is tipo
+
+
+def test_clasificar_error_desconocido_no_es_reintentable():
+    error = clasificar_error(ValueError("raro"), "EGOS", "modelo")
+    assert not error.reintentable